@@ -37,7 +37,8 @@ CREATE TABLE IF NOT EXISTS group_members (
 );
 
 CREATE INDEX IF NOT EXISTS idx_group_members_group_id ON group_members (group_id);
-CREATE INDEX IF NOT EXISTS idx_group_members_user_id ON group_members (user_id);
+-- Covers membership probes and per-user group listings without a table lookup
+CREATE INDEX IF NOT EXISTS idx_gm_user_group ON group_members (user_id, group_id);
 
 CREATE TABLE IF NOT EXISTS messages (
     message_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -50,7 +51,8 @@ CREATE TABLE IF NOT EXISTS messages (
     FOREIGN KEY (sender_user_id) REFERENCES users(user_id) ON DELETE SET NULL -- Keep message if sender is deleted
 );
 
-CREATE INDEX IF NOT EXISTS idx_messages_group_id ON messages (group_id);
+-- (group_id, message_id) serves both per-group lookups and keyset pagination
+CREATE INDEX IF NOT EXISTS idx_messages_group_msgid ON messages (group_id, message_id DESC);
 CREATE INDEX IF NOT EXISTS idx_messages_sender_user_id ON messages (sender_user_id);
 CREATE INDEX IF NOT EXISTS idx_messages_sent_at ON messages (sent_at);
 
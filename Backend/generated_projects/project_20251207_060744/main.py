@@ -1,117 +1,217 @@
 import sqlite3
 import uvicorn
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Form
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import anyio
 import bcrypt
 import jwt
 import os
+import hashlib
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
 
 # --- Configuration ---
 DATABASE_NAME = "chat_app.db"
 SECRET_KEY = os.environ.get("SECRET_KEY", "your-super-secret-key") # Use environment variable for production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+TOKEN_CACHE_TTL_SECONDS = 30
+TOKEN_CACHE_MAX_SIZE = 10000
+PASSWORD_CACHE_TTL_SECONDS = 60
+PASSWORD_CACHE_MAX_SIZE = 2048
+# bcrypt releases the GIL, so hashing runs in parallel up to one thread per core.
+# Acquired inside the threadpool handlers, around the bcrypt calls only.
+bcrypt_limiter = threading.BoundedSemaphore(os.cpu_count() or 1)
 BASE_URL = "http://localhost:8080/api"
 UPLOAD_FOLDER = "uploads"
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
-# Create upload folder if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Resolved once; upload destinations are built relative to this directory
+UPLOAD_PATH = Path(UPLOAD_FOLDER).resolve()
+UPLOAD_PATH.mkdir(parents=True, exist_ok=True)
 
 # --- Database Setup ---
-def get_db():
-    """Opens and returns a database connection."""
-    db = sqlite3.connect(DATABASE_NAME)
+# Applied to every new connection. WAL lets readers run alongside a writer and,
+# with synchronous=NORMAL, avoids an fsync on every commit.
+SQLITE_PRAGMAS = """
+    PRAGMA journal_mode = WAL;
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -64000;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA foreign_keys = ON;
+"""
+
+DB_POOL_SIZE = 10
+# INSERT/UPDATE ... RETURNING needs SQLite 3.35+
+SQLITE_SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+def connect_db():
+    """Opens a new database connection with the PRAGMAs applied."""
+    db = sqlite3.connect(DATABASE_NAME, check_same_thread=False)
     db.row_factory = sqlite3.Row  # Return rows as dictionary-like objects
+    db.executescript(SQLITE_PRAGMAS)
     return db
 
-def init_db():
-    """Initializes the database with the schema if it doesn't exist."""
-    db = get_db()
-    cursor = db.cursor()
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL UNIQUE,
-            email TEXT NOT NULL UNIQUE,
-            password_hash TEXT NOT NULL,
-            display_name TEXT,
-            avatar_url TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users (username);")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);")
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS groups (
-            group_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            group_name TEXT NOT NULL UNIQUE,
-            description TEXT,
-            created_by_user_id INTEGER NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (created_by_user_id) REFERENCES users(user_id)
-        );
-    """)
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_groups_group_name ON groups (group_name);")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_groups_created_by_user_id ON groups (created_by_user_id);")
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS group_members (
-            group_member_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            group_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            role TEXT DEFAULT 'member',
-            joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (group_id) REFERENCES groups(group_id) ON DELETE CASCADE,
-            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-            UNIQUE (group_id, user_id)
-        );
-    """)
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_group_members_group_id ON group_members (group_id);")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_group_members_user_id ON group_members (user_id);")
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections reused across requests.
+    Keeping connections open preserves SQLite's page and statement caches.
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS messages (
-            message_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            group_id INTEGER NOT NULL,
-            sender_user_id INTEGER NOT NULL,
-            content TEXT NOT NULL,
-            sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            media_url TEXT,
-            FOREIGN KEY (group_id) REFERENCES groups(group_id) ON DELETE CASCADE,
-            FOREIGN KEY (sender_user_id) REFERENCES users(user_id) ON DELETE SET NULL
-        );
-    """)
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_group_id ON messages (group_id);")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_sender_user_id ON messages (sender_user_id);")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_sent_at ON messages (sent_at);")
+    Slots are awaited on the event loop, before the request takes a threadpool
+    thread: blocking a worker thread on a free slot would let waiting requests
+    use up the threadpool and starve the handlers that hold the connections.
+    """
+    def __init__(self, max_size: int = DB_POOL_SIZE):
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._slots = anyio.Semaphore(max_size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+
+    async def acquire(self) -> sqlite3.Connection:
+        """Waits for a free slot, then returns an idle connection or opens one."""
+        await self._slots.acquire()
+        try:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                db = connect_db()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return db
+
+    def release(self, db: sqlite3.Connection):
+        """Returns a connection to the pool, discarding it if it is unusable."""
+        try:
+            if db.in_transaction:
+                db.rollback()
+            self._idle.put(db)
+        except sqlite3.Error:
+            db.close()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns current pool usage."""
+        with self._lock:
+            return {"max_size": self.max_size, "in_use": self._in_use, "idle": self._idle.qsize()}
+
+db_pool = ConnectionPool()
+
+async def get_db():
+    """Yields a pooled database connection for the duration of a request."""
+    db = await db_pool.acquire()
+    try:
+        yield db
+    finally:
+        db_pool.release(db)
+
+# Bump when SCHEMA_SQL changes so existing databases pick up the new DDL
+SCHEMA_VERSION = 1
+
+SCHEMA_SQL = f"""
+BEGIN;
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    display_name TEXT,
+    avatar_url TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users (username);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+
+CREATE TABLE IF NOT EXISTS groups (
+    group_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_name TEXT NOT NULL UNIQUE,
+    description TEXT,
+    created_by_user_id INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (created_by_user_id) REFERENCES users(user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_groups_group_name ON groups (group_name);
+CREATE INDEX IF NOT EXISTS idx_groups_created_by_user_id ON groups (created_by_user_id);
+
+CREATE TABLE IF NOT EXISTS group_members (
+    group_member_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    role TEXT DEFAULT 'member',
+    joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (group_id) REFERENCES groups(group_id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+    UNIQUE (group_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_group_members_group_id ON group_members (group_id);
+-- Covers membership probes and per-user group listings without a table lookup
+DROP INDEX IF EXISTS idx_group_members_user_id;
+CREATE INDEX IF NOT EXISTS idx_gm_user_group ON group_members (user_id, group_id);
+
+CREATE TABLE IF NOT EXISTS messages (
+    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id INTEGER NOT NULL,
+    sender_user_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    media_url TEXT,
+    FOREIGN KEY (group_id) REFERENCES groups(group_id) ON DELETE CASCADE,
+    FOREIGN KEY (sender_user_id) REFERENCES users(user_id) ON DELETE SET NULL
+);
+-- (group_id, message_id) serves both per-group lookups and keyset pagination
+DROP INDEX IF EXISTS idx_messages_group_id;
+CREATE INDEX IF NOT EXISTS idx_messages_group_msgid ON messages (group_id, message_id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_sender_user_id ON messages (sender_user_id);
+CREATE INDEX IF NOT EXISTS idx_messages_sent_at ON messages (sent_at);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    message TEXT,
+    read_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications (user_id);
+CREATE INDEX IF NOT EXISTS idx_notifications_type ON notifications (type);
+CREATE INDEX IF NOT EXISTS idx_notifications_created_at ON notifications (created_at);
+PRAGMA user_version = {SCHEMA_VERSION};
+COMMIT;
+"""
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS notifications (
-            notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            type TEXT NOT NULL,
-            message TEXT,
-            read_at DATETIME,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-        );
-    """)
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications (user_id);")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notifications_type ON notifications (type);")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notifications_created_at ON notifications (created_at);")
-
-    db.commit()
-    db.close()
-
-# Initialize the database when the application starts
-init_db()
+def init_db():
+    """Initializes the database with the schema unless it is already at SCHEMA_VERSION."""
+    db = connect_db()
+    try:
+        user_version = db.execute("PRAGMA user_version").fetchone()[0]
+        if user_version < SCHEMA_VERSION:
+            db.executescript(SCHEMA_SQL)
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initializes the database once at startup rather than on every import."""
+    init_db()
+    yield
 
 # --- Pydantic Models ---
 
@@ -165,8 +265,8 @@ class GroupListResponse(BaseModel):
 
 # Message Models
 class MessageCreate(BaseModel):
-    group_id: str
-    sender_id: str
+    group_id: int
+    sender_id: int
     content: str
     media_url: Optional[str] = None
 
@@ -185,20 +285,75 @@ class UploadResponse(BaseModel):
 # --- Security ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{BASE_URL}/users/login")
 
+# Built once so encode/decode don't re-encode the key or rebuild the codec on every request
+jwt_codec = jwt.PyJWT()
+jwt_key = SECRET_KEY.encode("utf-8")
+jwt_algorithms = [ALGORITHM]
+
 def create_access_token(data: dict):
     """Creates a JWT access token."""
-    encoded_jwt = jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt_codec.encode(data, jwt_key, algorithm=ALGORITHM)
     return encoded_jwt
 
+class TTLCache:
+    """A small thread-safe cache whose entries expire at a per-entry timestamp.
+
+    Entries are kept in insertion order, so eviction pops the oldest in O(1);
+    expired entries are dropped when a lookup or the head of the order finds them.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] > now:
+            return entry[0]
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        return None
+
+    def set(self, key, value, expires_at: float, now: float):
+        with self._lock:
+            self._entries.pop(key, None)
+            while self._entries:
+                oldest_expiry = next(iter(self._entries.values()))[1]
+                if oldest_expiry > now and len(self._entries) < self.max_size:
+                    break
+                self._entries.popitem(last=False)
+            self._entries[key] = (value, expires_at)
+
+    def __len__(self):
+        return len(self._entries)
+
+# Verified token payloads, kept until the TTL or the token's own expiry
+token_cache = TTLCache(TOKEN_CACHE_MAX_SIZE)
+# Successful password checks, keyed by a digest of the password and its stored hash
+password_cache = TTLCache(PASSWORD_CACHE_MAX_SIZE)
+
 def verify_access_token(token: str):
     """Verifies a JWT access token and returns the payload."""
+    now = time.time()
+    cached = token_cache.get(token, now)
+    if cached is not None:
+        return cached
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        payload = jwt_codec.decode(token, jwt_key, algorithms=jwt_algorithms)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    expires_at = now + TOKEN_CACHE_TTL_SECONDS
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        expires_at = min(expires_at, exp)
+    token_cache.set(token, payload, expires_at, now)
+    return payload
 
 def get_current_user_id(token: str = Depends(oauth2_scheme)):
     """Dependency to get the current user ID from the token."""
@@ -206,7 +361,10 @@ def get_current_user_id(token: str = Depends(oauth2_scheme)):
     user_id = payload.get("sub")
     if user_id is None:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
-    return user_id
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
 
 def get_user_from_db(db: sqlite3.Connection, user_id: int):
     """Fetches a user from the database by ID."""
@@ -219,12 +377,26 @@ def get_user_from_db(db: sqlite3.Connection, user_id: int):
 def hash_password(password: str) -> str:
     """Hashes a password using bcrypt."""
     salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
+    with bcrypt_limiter:
+        hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed_password.decode('utf-8')
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifies a plain password against a hashed password."""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    """Verifies a plain password against a hashed password.
+
+    Only successful checks are cached; the stored hash is part of the key, so a
+    password change naturally invalidates earlier entries.
+    """
+    now = time.time()
+    key = hashlib.sha256(plain_password.encode('utf-8') + b":" + hashed_password.encode('utf-8')).digest()
+    if password_cache.get(key, now):
+        return True
+    with bcrypt_limiter:
+        matches = bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    if not matches:
+        return False
+    password_cache.set(key, True, now + PASSWORD_CACHE_TTL_SECONDS, now)
+    return True
 
 def get_user_by_username(db: sqlite3.Connection, username: str):
     """Fetches a user from the database by username."""
@@ -238,21 +410,46 @@ def get_user_by_email(db: sqlite3.Connection, email: str):
     cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
     return cursor.fetchone()
 
-def get_group_by_id(db: sqlite3.Connection, group_id: int):
-    """Fetches a group from the database by ID."""
+def get_group_by_name(db: sqlite3.Connection, group_name: str):
+    """Fetches a group from the database by name."""
     cursor = db.cursor()
-    cursor.execute("SELECT * FROM groups WHERE group_id = ?", (group_id,))
+    cursor.execute("SELECT * FROM groups WHERE group_name = ? LIMIT 1", (group_name,))
     return cursor.fetchone()
 
-def get_group_members(db: sqlite3.Connection, group_id: int):
-    """Fetches all members of a group."""
+def get_group_with_members(db: sqlite3.Connection, group_id: int):
+    """Fetches a group and its member usernames in a single query.
+
+    Returns (group_row, usernames), or (None, []) when the group does not exist.
+    """
     cursor = db.cursor()
     cursor.execute("""
-        SELECT u.username FROM group_members gm
-        JOIN users u ON gm.user_id = u.user_id
-        WHERE gm.group_id = ?
+        SELECT g.*, GROUP_CONCAT(u.username, char(31)) AS members
+        FROM groups g
+        LEFT JOIN group_members gm ON gm.group_id = g.group_id
+        LEFT JOIN users u ON u.user_id = gm.user_id
+        WHERE g.group_id = ?
+        GROUP BY g.group_id
     """, (group_id,))
-    return [row["username"] for row in cursor.fetchall()]
+    row = cursor.fetchone()
+    if row is None:
+        return None, []
+    members = row["members"].split(chr(31)) if row["members"] else []
+    return row, members
+
+def get_group_membership(db: sqlite3.Connection, group_id: int, user_id: int):
+    """Fetches a group's creator together with the user's membership in one query.
+
+    Returns None if the group does not exist; otherwise a row whose is_member
+    and role columns describe the user's membership.
+    """
+    cursor = db.cursor()
+    cursor.execute("""
+        SELECT g.created_by_user_id, gm.user_id IS NOT NULL AS is_member, gm.role
+        FROM groups g
+        LEFT JOIN group_members gm ON gm.group_id = g.group_id AND gm.user_id = ?
+        WHERE g.group_id = ?
+    """, (user_id, group_id))
+    return cursor.fetchone()
 
 def is_user_in_group(db: sqlite3.Connection, user_id: int, group_id: int) -> bool:
     """Checks if a user is a member of a group."""
@@ -281,7 +478,8 @@ app = FastAPI(
     version="1.0.0",
     openapi_url="/api/openapi.json",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -296,6 +494,13 @@ app.add_middleware(
 
 # --- API Endpoints ---
 
+@app.get("/api/pool-health", tags=["Health"])
+def pool_health():
+    """
+    Reports database connection pool usage.
+    """
+    return db_pool.stats()
+
 @app.post("/api/users/register", response_model=UserResponse, tags=["Users"])
 def register_user(user: UserCreate, db: sqlite3.Connection = Depends(get_db)):
     """
@@ -336,16 +541,11 @@ def login_user(user_login: UserLogin, db: sqlite3.Connection = Depends(get_db)):
     return Token(token=access_token)
 
 @app.get("/api/users/{user_id}", response_model=UserProfileResponse, tags=["Users"])
-def get_user_profile(user_id: str, db: sqlite3.Connection = Depends(get_db)):
+def get_user_profile(user_id: int, db: sqlite3.Connection = Depends(get_db)):
     """
     Retrieves a user's profile information.
     """
-    try:
-        user_id_int = int(user_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid user ID format")
-
-    user = get_user_from_db(db, user_id_int)
+    user = get_user_from_db(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -361,7 +561,7 @@ def get_user_profile(user_id: str, db: sqlite3.Connection = Depends(get_db)):
 
 @app.patch("/api/users/{user_id}", response_model=UserResponse, tags=["Users"])
 def update_user_profile(
-    user_id: str,
+    user_id: int,
     user_update: UserUpdate,
     db: sqlite3.Connection = Depends(get_db),
     current_user_id: int = Depends(get_current_user_id)
@@ -370,15 +570,10 @@ def update_user_profile(
     Updates a user's profile information.
     Only the authenticated user can update their own profile.
     """
-    try:
-        user_id_int = int(user_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid user ID format")
-
-    if user_id_int != current_user_id:
+    if user_id != current_user_id:
         raise HTTPException(status_code=403, detail="You can only update your own profile")
 
-    user = get_user_from_db(db, user_id_int)
+    user = get_user_from_db(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -396,15 +591,20 @@ def update_user_profile(
         raise HTTPException(status_code=400, detail="No fields to update")
 
     set_clause = ", ".join([f"{key} = ?" for key in updates.keys()])
-    values = list(updates.values()) + [user_id_int]
+    values = list(updates.values()) + [user_id]
 
     cursor = db.cursor()
     try:
-        cursor.execute(f"UPDATE users SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?", values)
-        db.commit()
-        # Fetch the updated user to return
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id_int,))
-        updated_user = cursor.fetchone()
+        update_sql = f"UPDATE users SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?"
+        if SQLITE_SUPPORTS_RETURNING:
+            cursor.execute(update_sql + " RETURNING user_id, username, email", values)
+            updated_user = cursor.fetchone()
+            db.commit()
+        else:
+            cursor.execute(update_sql, values)
+            db.commit()
+            cursor.execute("SELECT user_id, username, email FROM users WHERE user_id = ?", (user_id,))
+            updated_user = cursor.fetchone()
         return UserResponse(
             user_id=str(updated_user["user_id"]),
             username=updated_user["username"],
@@ -422,11 +622,13 @@ def create_group(group: GroupCreate, db: sqlite3.Connection = Depends(get_db), c
     """
     Creates a new group.
     """
-    if get_group_by_id(db, group.name): # Check if group name already exists
-        raise HTTPException(status_code=400, detail="Group name already exists")
+    if get_group_by_name(db, group.name):
+        raise HTTPException(status_code=409, detail="Group name already exists")
 
     cursor = db.cursor()
     try:
+        # Take the write lock up front so both inserts commit together
+        cursor.execute("BEGIN IMMEDIATE")
         cursor.execute(
             "INSERT INTO groups (group_name, description, created_by_user_id) VALUES (?, ?, ?)",
             (group.name, group.description, current_user_id)
@@ -440,25 +642,23 @@ def create_group(group: GroupCreate, db: sqlite3.Connection = Depends(get_db), c
         )
         db.commit()
         return GroupResponse(group_id=str(group_id), name=group.name, creator_id=str(current_user_id))
-    except sqlite3.IntegrityError:
+    except sqlite3.IntegrityError as e:
         db.rollback()
+        # A concurrent request may have created the same name after our check
+        if "UNIQUE" in str(e):
+            raise HTTPException(status_code=409, detail="Group name already exists")
         raise HTTPException(status_code=500, detail="Database integrity error during group creation")
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
 
 @app.get("/api/groups", response_model=List[GroupListResponse], tags=["Groups"])
-def get_user_groups(user_id: str, db: sqlite3.Connection = Depends(get_db)):
+def get_user_groups(user_id: int, db: sqlite3.Connection = Depends(get_db)):
     """
     Retrieves all groups a user is a member of.
     """
-    try:
-        user_id_int = int(user_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid user ID format")
-
     # Verify user exists
-    if not get_user_from_db(db, user_id_int):
+    if not get_user_from_db(db, user_id):
         raise HTTPException(status_code=404, detail="User not found")
 
     cursor = db.cursor()
@@ -467,26 +667,19 @@ def get_user_groups(user_id: str, db: sqlite3.Connection = Depends(get_db)):
         FROM groups g
         JOIN group_members gm ON g.group_id = gm.group_id
         WHERE gm.user_id = ?
-    """, (user_id_int,))
+    """, (user_id,))
     groups = [GroupListResponse(group_id=str(row["group_id"]), name=row["group_name"]) for row in cursor.fetchall()]
     return groups
 
 @app.get("/api/groups/{group_id}", response_model=GroupDetailsResponse, tags=["Groups"])
-def get_group_details(group_id: str, db: sqlite3.Connection = Depends(get_db)):
+def get_group_details(group_id: int, db: sqlite3.Connection = Depends(get_db)):
     """
     Retrieves details of a specific group, including its members.
     """
-    try:
-        group_id_int = int(group_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid group ID format")
-
-    group = get_group_by_id(db, group_id_int)
+    group, members = get_group_with_members(db, group_id)
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
 
-    members = get_group_members(db, group_id_int)
-
     return GroupDetailsResponse(
         group_id=str(group["group_id"]),
         name=group["group_name"],
@@ -495,30 +688,29 @@ def get_group_details(group_id: str, db: sqlite3.Connection = Depends(get_db)):
     )
 
 @app.post("/api/groups/{group_id}/join", response_model={}, tags=["Groups"])
-def join_group(group_id: str, db: sqlite3.Connection = Depends(get_db), current_user_id: int = Depends(get_current_user_id)):
+def join_group(group_id: int, db: sqlite3.Connection = Depends(get_db), current_user_id: int = Depends(get_current_user_id)):
     """
     Allows a user to join a group.
     """
-    try:
-        group_id_int = int(group_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid group ID format")
-
-    group = get_group_by_id(db, group_id_int)
-    if not group:
+    membership = get_group_membership(db, group_id, current_user_id)
+    if not membership:
         raise HTTPException(status_code=404, detail="Group not found")
-
-    if is_user_in_group(db, current_user_id, group_id_int):
+    if membership["is_member"]:
         raise HTTPException(status_code=400, detail="You are already a member of this group")
 
     cursor = db.cursor()
     try:
+        # UNIQUE (group_id, user_id) makes a concurrent duplicate join a no-op
         cursor.execute(
-            "INSERT INTO group_members (group_id, user_id) VALUES (?, ?)",
-            (group_id_int, current_user_id)
+            "INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)",
+            (group_id, current_user_id)
         )
         db.commit()
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=400, detail="You are already a member of this group")
         return {"message": "Successfully joined the group"}
+    except HTTPException:
+        raise
     except sqlite3.IntegrityError:
         db.rollback()
         raise HTTPException(status_code=500, detail="Database integrity error when joining group")
@@ -527,34 +719,26 @@ def join_group(group_id: str, db: sqlite3.Connection = Depends(get_db), current_
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
 
 @app.post("/api/groups/{group_id}/leave", response_model={}, tags=["Groups"])
-def leave_group(group_id: str, db: sqlite3.Connection = Depends(get_db), current_user_id: int = Depends(get_current_user_id)):
+def leave_group(group_id: int, db: sqlite3.Connection = Depends(get_db), current_user_id: int = Depends(get_current_user_id)):
     """
     Allows a user to leave a group.
     """
-    try:
-        group_id_int = int(group_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid group ID format")
-
-    group = get_group_by_id(db, group_id_int)
-    if not group:
+    membership = get_group_membership(db, group_id, current_user_id)
+    if not membership:
         raise HTTPException(status_code=404, detail="Group not found")
-
-    if not is_user_in_group(db, current_user_id, group_id_int):
+    if not membership["is_member"]:
         raise HTTPException(status_code=400, detail="You are not a member of this group")
 
     # Prevent leaving if you are the only admin and the creator
     cursor = db.cursor()
-    cursor.execute("SELECT role FROM group_members WHERE user_id = ? AND group_id = ?", (current_user_id, group_id_int))
-    user_role = cursor.fetchone()
-    if user_role and user_role["role"] == 'admin' and group["created_by_user_id"] == current_user_id:
-        cursor.execute("SELECT COUNT(*) FROM group_members WHERE group_id = ? AND role = 'admin'", (group_id_int,))
+    if membership["role"] == 'admin' and membership["created_by_user_id"] == current_user_id:
+        cursor.execute("SELECT COUNT(*) FROM group_members WHERE group_id = ? AND role = 'admin'", (group_id,))
         admin_count = cursor.fetchone()[0]
         if admin_count <= 1:
             raise HTTPException(status_code=400, detail="You cannot leave as you are the only admin and creator of the group.")
 
     try:
-        cursor.execute("DELETE FROM group_members WHERE group_id = ? AND user_id = ?", (group_id_int, current_user_id))
+        cursor.execute("DELETE FROM group_members WHERE group_id = ? AND user_id = ?", (group_id, current_user_id))
         db.commit()
         return {"message": "Successfully left the group"}
     except Exception as e:
@@ -570,34 +754,26 @@ def send_message(
     """
     Sends a message to a group.
     """
-    try:
-        group_id_int = int(message.group_id)
-        sender_id_int = int(message.sender_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid group ID or sender ID format")
-
-    if group_id_int not in [g["group_id"] for g in get_user_groups(db, str(current_user_id))]:
-        raise HTTPException(status_code=403, detail="You are not a member of this group")
-
-    if sender_id_int != current_user_id:
+    if message.sender_id != current_user_id:
         raise HTTPException(status_code=403, detail="Sender ID must match authenticated user ID")
 
-    group = get_group_by_id(db, group_id_int)
-    if not group:
-        raise HTTPException(status_code=404, detail="Group not found")
+    # A membership row implies the group exists (FOREIGN KEY), so no separate group lookup
+    if not is_user_in_group(db, current_user_id, message.group_id):
+        raise HTTPException(status_code=403, detail="You are not a member of this group")
 
     cursor = db.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO messages (group_id, sender_user_id, content, media_url) VALUES (?, ?, ?, ?)",
-            (group_id_int, sender_id_int, message.content, message.media_url)
-        )
-        db.commit()
-        message_id = cursor.lastrowid
-
-        # Fetch the created message to return
-        cursor.execute("SELECT * FROM messages WHERE message_id = ?", (message_id,))
-        created_message = cursor.fetchone()
+        insert_sql = "INSERT INTO messages (group_id, sender_user_id, content, media_url) VALUES (?, ?, ?, ?)"
+        params = (message.group_id, message.sender_id, message.content, message.media_url)
+        if SQLITE_SUPPORTS_RETURNING:
+            cursor.execute(insert_sql + " RETURNING message_id, group_id, sender_user_id, content, sent_at, media_url", params)
+            created_message = cursor.fetchone()
+            db.commit()
+        else:
+            cursor.execute(insert_sql, params)
+            db.commit()
+            cursor.execute("SELECT * FROM messages WHERE message_id = ?", (cursor.lastrowid,))
+            created_message = cursor.fetchone()
 
         return MessageResponse(
             message_id=str(created_message["message_id"]),
@@ -614,11 +790,13 @@ def send_message(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
 
+MESSAGE_COLUMNS = "message_id, group_id, sender_user_id, content, sent_at, media_url"
+
 @app.get("/api/messages/{group_id}", response_model=List[MessageResponse], tags=["Messages"])
 def get_messages_in_group(
-    group_id: str,
+    group_id: int,
     limit: Optional[int] = 20,
-    before: Optional[str] = None,
+    before: Optional[int] = None,
     db: sqlite3.Connection = Depends(get_db),
     current_user_id: int = Depends(get_current_user_id)
 ):
@@ -626,58 +804,39 @@ def get_messages_in_group(
     Retrieves messages from a specific group.
     Supports pagination with 'limit' and 'before' (message_id).
     """
-    try:
-        group_id_int = int(group_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid group ID format")
-
-    if not is_user_in_group(db, current_user_id, group_id_int):
+    if not is_user_in_group(db, current_user_id, group_id):
         raise HTTPException(status_code=403, detail="You are not a member of this group")
 
     cursor = db.cursor()
-    query = """
-        SELECT * FROM messages
-        WHERE group_id = ?
-    """
-    params = [group_id_int]
-
-    if before:
-        try:
-            before_message_id_int = int(before)
-            cursor.execute("SELECT sent_at FROM messages WHERE message_id = ?", (before_message_id_int,))
-            before_timestamp_result = cursor.fetchone()
-            if not before_timestamp_result:
-                raise HTTPException(status_code=404, detail="Message ID for 'before' parameter not found")
-            before_timestamp = before_timestamp_result["sent_at"]
-            query += " AND sent_at < ? ORDER BY sent_at DESC"
-            params.append(before_timestamp)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid 'before' message ID format")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error processing 'before' parameter: {e}")
+    if before is not None:
+        # message_id is AUTOINCREMENT, so it is a unique, monotonic keyset cursor
+        cursor.execute(
+            f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE group_id = ? AND message_id < ? ORDER BY message_id DESC LIMIT ?",
+            (group_id, before, limit)
+        )
     else:
-        query += " ORDER BY sent_at DESC"
-
-    query += " LIMIT ?"
-    params.append(limit)
-
-    cursor.execute(query, tuple(params))
+        cursor.execute(
+            f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE group_id = ? ORDER BY message_id DESC LIMIT ?",
+            (group_id, limit)
+        )
     messages_rows = cursor.fetchall()
 
     # Reverse to maintain chronological order in response if 'before' was used
-    if before:
+    if before is not None:
         messages_rows.reverse()
 
+    # Unpack positionally (column order fixed by MESSAGE_COLUMNS) instead of keyed Row lookups.
+    # Plain dicts are validated once by response_model rather than building a model per row first.
     messages = [
-        MessageResponse(
-            message_id=str(row["message_id"]),
-            group_id=str(row["group_id"]),
-            sender_id=str(row["sender_user_id"]) if row["sender_user_id"] else None, # Handle potential NULL sender_user_id
-            content=row["content"],
-            timestamp=row["sent_at"],
-            media_url=row["media_url"]
-        )
-        for row in messages_rows
+        {
+            "message_id": str(message_id),
+            "group_id": str(row_group_id),
+            "sender_id": str(sender_user_id) if sender_user_id else None, # Handle potential NULL sender_user_id
+            "content": content,
+            "timestamp": sent_at,
+            "media_url": media_url,
+        }
+        for message_id, row_group_id, sender_user_id, content, sent_at, media_url in messages_rows
     ]
     return messages
 
@@ -687,15 +846,22 @@ async def upload_media(file: UploadFile = File(...), db: sqlite3.Connection = De
     Uploads a media file and returns its URL.
     (This is a simplified implementation. In a real app, you'd use cloud storage like S3.)
     """
-    file_location = os.path.join(UPLOAD_FOLDER, file.filename)
+    # Keep only the base name and prefix it so uploads can't escape or overwrite each other
+    filename = f"{uuid.uuid4().hex}_{Path(file.filename or 'upload').name}"
+    file_location = UPLOAD_PATH / filename
+    if file_location.parent != UPLOAD_PATH:
+        raise HTTPException(status_code=400, detail="Invalid file name")
     try:
-        with open(file_location, "wb+") as file_object:
-            file_object.write(await file.read())
+        # Stream to disk in chunks rather than reading the whole upload into memory
+        async with await anyio.open_file(file_location, "wb") as file_object:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await file_object.write(chunk)
         # In a real application, you would upload this to a cloud storage service
         # and return the permanent URL. For this example, we return a local path.
-        media_url = f"/static/{file.filename}" # Assuming static files are served
+        media_url = f"/static/{filename}" # Assuming static files are served
         return UploadResponse(media_url=media_url)
     except Exception as e:
+        file_location.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"File upload failed: {e}")
 
 # --- Main Application Runner ---
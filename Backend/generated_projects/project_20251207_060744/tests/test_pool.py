@@ -0,0 +1,45 @@
+import os
+import sys
+
+import anyio
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import main
+
+
+def test_pool_recovers_when_requests_outnumber_threadpool(tmp_path, monkeypatch):
+    """More concurrent requests than worker threads must all complete, not deadlock."""
+    monkeypatch.setattr(main, "DATABASE_NAME", str(tmp_path / "pool_test.db"))
+    main.init_db()
+    db = main.connect_db()
+    db.execute(
+        "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+        ("pooluser", "pool@example.com", "x"),
+    )
+    db.commit()
+    user_id = db.execute("SELECT user_id FROM users WHERE username = 'pooluser'").fetchone()[0]
+    db.close()
+
+    statuses = []
+
+    async def fetch(client):
+        response = await client.get(f"/api/users/{user_id}")
+        statuses.append(response.status_code)
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            with anyio.fail_after(30):
+                async with anyio.create_task_group() as tg:
+                    for _ in range(60):
+                        tg.start_soon(fetch, client)
+            health = (await client.get("/api/pool-health")).json()
+        return health
+
+    health = anyio.run(run)
+
+    assert statuses == [200] * 60
+    assert health["in_use"] == 0
+    assert health["idle"] <= main.DB_POOL_SIZE
@@ -3,7 +3,7 @@ CREATE TABLE IF NOT EXISTS users (
     user_id INTEGER PRIMARY KEY AUTOINCREMENT,
     username TEXT NOT NULL UNIQUE,
     email TEXT NOT NULL UNIQUE,
-    password_hash TEXT NOT NULL,
+    password_hash TEXT NOT NULL, -- Argon2id encoded hash (~96 chars, includes salt and params)
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
@@ -53,4 +53,27 @@ CREATE TABLE IF NOT EXISTS auth_tokens (
     expires_at DATETIME NOT NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+-- Per-group message totals, kept current by triggers so reads avoid COUNT(*)
+CREATE TABLE IF NOT EXISTS group_message_counts (
+    group_id INTEGER PRIMARY KEY,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_messages_count_insert AFTER INSERT ON messages
+BEGIN
+    INSERT INTO group_message_counts (group_id, message_count) VALUES (NEW.group_id, 1)
+    ON CONFLICT(group_id) DO UPDATE SET message_count = message_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_messages_count_delete AFTER DELETE ON messages
+BEGIN
+    UPDATE group_message_counts SET message_count = message_count - 1 WHERE group_id = OLD.group_id;
+END;
+
+-- Indexes for the hot lookups. users(email) and group_members(group_id, ...)
+-- are already served by the indexes behind their UNIQUE constraints.
+CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members (user_id, group_id);
+CREATE INDEX IF NOT EXISTS idx_messages_group_sent_id ON messages (group_id, sent_at, message_id);
+CREATE INDEX IF NOT EXISTS idx_auth_tokens_user ON auth_tokens (user_id);
@@ -1,98 +1,203 @@
 # main.py
 import sqlite3
+import threading
+import weakref
+import time
 import uvicorn
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+import itertools
+import re
 import secrets
+import shutil
+import hashlib
+import hmac
 import os
+import jwt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 
 # --- Database Configuration ---
 DATABASE_NAME = "chat_app.db"
 
+# Applied once when each connection is opened. WAL lets readers run alongside
+# a writer; NORMAL sync is durable across app crashes in WAL mode.
+SQLITE_PRAGMAS = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -64000;
+PRAGMA mmap_size = 268435456;
+"""
+
+# INSERT/UPDATE ... RETURNING needs SQLite 3.35+
+SQLITE_SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Current UTC time with milliseconds; CURRENT_TIMESTAMP only has whole seconds,
+# so an edit in the same second as the insert would leave updated_at == created_at
+SQL_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+class PersistentConnection(sqlite3.Connection):
+    """
+    A connection that stays open for the life of its thread so the page cache
+    and PRAGMAs survive between requests. Route handlers still call close()
+    when done; that only rolls back anything left uncommitted.
+    """
+    is_shut_down = False
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def shutdown(self):
+        """Actually closes the underlying connection."""
+        self.is_shut_down = True
+        super().close()
+
+class _ThreadConnection:
+    """
+    Holds a thread's connection in thread-local storage and shuts it down when
+    the thread exits. anyio retires idle threadpool threads and starts new ones
+    for the next burst, so connections must not outlive their thread.
+    """
+    def __init__(self, conn: PersistentConnection):
+        self.conn = conn
+
+    def __del__(self):
+        self.conn.shutdown()
+
+_thread_local = threading.local()
+# Weak, so this registry (used for shutdown) never keeps a dead thread's connection alive
+_open_connections: "weakref.WeakSet[PersistentConnection]" = weakref.WeakSet()
+_open_connections_lock = threading.Lock()
+
 def get_db_connection():
-    """Establishes and returns a database connection."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row  # Return rows as dictionary-like objects
-    return conn
+    """Returns this thread's database connection, opening it on first use."""
+    owner = getattr(_thread_local, "owner", None)
+    if owner is None or owner.conn.is_shut_down:
+        conn = sqlite3.connect(DATABASE_NAME, check_same_thread=False, factory=PersistentConnection)
+        conn.row_factory = sqlite3.Row  # Return rows as dictionary-like objects
+        conn.executescript(SQLITE_PRAGMAS)
+        owner = _ThreadConnection(conn)
+        _thread_local.owner = owner
+        with _open_connections_lock:
+            _open_connections.add(conn)
+    return owner.conn
+
+def close_db_connections():
+    """Closes every connection opened by get_db_connection (called at shutdown)."""
+    with _open_connections_lock:
+        for conn in list(_open_connections):
+            conn.shutdown()
+        _open_connections.clear()
+
+# Every schema statement, run by init_db as a single script inside one transaction
+# so a fresh database is created with one commit instead of one per statement.
+SCHEMA_SQL = """
+-- Table for storing user information
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL, -- Argon2id encoded hash (~96 chars, includes salt and params)
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Table for storing group information
+CREATE TABLE IF NOT EXISTS groups (
+    group_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_name TEXT NOT NULL,
+    group_description TEXT,
+    created_by_user_id INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (created_by_user_id) REFERENCES users(user_id)
+);
+
+-- Table for managing group memberships
+CREATE TABLE IF NOT EXISTS group_members (
+    group_member_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (group_id) REFERENCES groups(group_id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+    UNIQUE(group_id, user_id) -- A user can only be a member of a group once
+);
+
+-- Table for storing chat messages
+CREATE TABLE IF NOT EXISTS messages (
+    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id INTEGER NOT NULL,
+    sender_user_id INTEGER NOT NULL,
+    message_text TEXT,
+    media_url TEXT, -- URL to the multimedia file in cloud storage
+    media_type TEXT, -- e.g., 'image', 'video', 'file'
+    sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (group_id) REFERENCES groups(group_id) ON DELETE CASCADE,
+    FOREIGN KEY (sender_user_id) REFERENCES users(user_id)
+);
+
+-- Table for storing authentication tokens (e.g., JWT refresh tokens if needed for persistence)
+CREATE TABLE IF NOT EXISTS auth_tokens (
+    token_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    token TEXT NOT NULL UNIQUE,
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- Per-group message totals, kept current by triggers so reads avoid COUNT(*)
+CREATE TABLE IF NOT EXISTS group_message_counts (
+    group_id INTEGER PRIMARY KEY,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS trg_messages_count_insert AFTER INSERT ON messages
+BEGIN
+    INSERT INTO group_message_counts (group_id, message_count) VALUES (NEW.group_id, 1)
+    ON CONFLICT(group_id) DO UPDATE SET message_count = message_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_messages_count_delete AFTER DELETE ON messages
+BEGIN
+    UPDATE group_message_counts SET message_count = message_count - 1 WHERE group_id = OLD.group_id;
+END;
+
+-- Every UPDATE sets updated_at itself; remove the stamping triggers older databases have
+DROP TRIGGER IF EXISTS trg_users_updated_at;
+DROP TRIGGER IF EXISTS trg_groups_updated_at;
+
+-- Indexes for the hot lookups. users(email) and group_members(group_id, ...)
+-- are already served by the indexes behind their UNIQUE constraints.
+CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members (user_id, group_id);
+-- (group_id, sent_at, message_id) serves newest-first pages, tie-broken by id, as a reverse scan
+DROP INDEX IF EXISTS idx_messages_group_sent;
+CREATE INDEX IF NOT EXISTS idx_messages_group_sent_id ON messages (group_id, sent_at, message_id);
+CREATE INDEX IF NOT EXISTS idx_auth_tokens_user ON auth_tokens (user_id);
+"""
+
+# Run only when group_message_counts is first created, to seed it from existing messages
+MESSAGE_COUNTS_BACKFILL_SQL = """
+INSERT INTO group_message_counts (group_id, message_count)
+SELECT group_id, COUNT(*) FROM messages GROUP BY group_id;
+"""
 
 def init_db():
     """Initializes the database with the defined schema."""
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Table for storing user information
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT NOT NULL UNIQUE,
-        email TEXT NOT NULL UNIQUE,
-        password_hash TEXT NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-
-    # Table for storing group information
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS groups (
-        group_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        group_name TEXT NOT NULL,
-        group_description TEXT,
-        created_by_user_id INTEGER NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (created_by_user_id) REFERENCES users(user_id)
-    );
-    """)
-
-    # Table for managing group memberships
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS group_members (
-        group_member_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        group_id INTEGER NOT NULL,
-        user_id INTEGER NOT NULL,
-        joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (group_id) REFERENCES groups(group_id) ON DELETE CASCADE,
-        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-        UNIQUE(group_id, user_id) -- A user can only be a member of a group once
-    );
-    """)
-
-    # Table for storing chat messages
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS messages (
-        message_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        group_id INTEGER NOT NULL,
-        sender_user_id INTEGER NOT NULL,
-        message_text TEXT,
-        media_url TEXT, -- URL to the multimedia file in cloud storage
-        media_type TEXT, -- e.g., 'image', 'video', 'file'
-        sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (group_id) REFERENCES groups(group_id) ON DELETE CASCADE,
-        FOREIGN KEY (sender_user_id) REFERENCES users(user_id)
-    );
-    """)
-
-    # Table for storing authentication tokens (e.g., JWT refresh tokens if needed for persistence)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS auth_tokens (
-        token_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        token TEXT NOT NULL UNIQUE,
-        expires_at DATETIME NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-    );
-    """)
-
-    conn.commit()
-    conn.close()
-
-# Initialize the database when the script starts
-init_db()
+    try:
+        needs_count_backfill = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'group_message_counts'"
+        ).fetchone() is None
+        script = SCHEMA_SQL + (MESSAGE_COUNTS_BACKFILL_SQL if needs_count_backfill else "")
+        conn.executescript(f"BEGIN IMMEDIATE;\n{script}\nCOMMIT;")
+    finally:
+        conn.close()
 
 # --- Pydantic Models ---
 
@@ -157,6 +262,7 @@ class GroupMemberAdd(BaseModel):
 # Message Models
 class MessageCreate(BaseModel):
     group_id: int
+    sender_id: Optional[int] = None
     content: Optional[str] = None
     media_url: Optional[str] = None
     media_type: Optional[str] = None
@@ -173,6 +279,15 @@ class Message(BaseModel):
     class Config:
         orm_mode = True
 
+class MessageCursor(BaseModel):
+    before: str
+    before_id: int
+
+class MessagePage(BaseModel):
+    messages: List[Message]
+    total_messages: int
+    next_cursor: Optional[MessageCursor] = None
+
 # Media Upload Model
 class MediaUploadResponse(BaseModel):
     media_url: str
@@ -180,7 +295,14 @@ class MediaUploadResponse(BaseModel):
     file_type: str
 
 # --- FastAPI App ---
-app = FastAPI(title="Chat App API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Creates the schema and warms the connection before serving, closes connections on shutdown."""
+    init_db()
+    yield
+    close_db_connections()
+
+app = FastAPI(title="Chat App API", version="1.0.0", lifespan=lifespan)
 
 # CORS Middleware
 origins = [
@@ -198,29 +320,191 @@ app.add_middleware(
 )
 
 # --- Helper Functions ---
+# Argon2id with one of OWASP's listed configurations (19 MiB, 2 iterations, 1 lane);
+# the smaller memory cost keeps concurrent hashes across the threadpool affordable
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19 * 1024, parallelism=1)
+
 def hash_password(password: str) -> str:
-    """
-    In a real application, use a strong hashing library like bcrypt.
-    For simplicity, this example uses a basic hash.
-    """
-    import hashlib
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hashes a password with Argon2id; salt and parameters are encoded in the result."""
+    return password_hasher.hash(password)
+
+def is_legacy_password_hash(hashed_password: str) -> bool:
+    """Returns True for unsalted SHA-256 hex digests stored before the switch to Argon2id."""
+    return not hashed_password.startswith("$argon2")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verifies a plain password against a hashed password.
+    Legacy SHA-256 hashes are still accepted (constant-time compare) so they can be upgraded on login.
+    """
+    if is_legacy_password_hash(hashed_password):
+        legacy_hash = hashlib.sha256(plain_password.encode()).hexdigest()
+        return hmac.compare_digest(legacy_hash, hashed_password)
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Returns True if the stored hash is legacy or uses outdated Argon2 parameters."""
+    return is_legacy_password_hash(hashed_password) or password_hasher.check_needs_rehash(hashed_password)
+
+# Set JWT_SECRET in production; the random fallback invalidates tokens on restart
+# and isn't shared between worker processes.
+JWT_SECRET = os.environ.get("JWT_SECRET") or secrets.token_urlsafe(32)
+JWT_ALGORITHM = "HS256"
+ACCESS_TOKEN_TTL_SECONDS = 3600
+# Legacy clients that post sender_id without a token; anyone can then post as
+# any user, so this stays off unless explicitly enabled.
+ALLOW_UNAUTHENTICATED_SENDER = os.environ.get("ALLOW_UNAUTHENTICATED_SENDER") == "1"
+
+def create_access_token(user_id: int) -> str:
+    """Issues a signed, self-contained access token; verifying it needs no database access."""
+    payload = {"sub": str(user_id), "exp": int(time.time()) + ACCESS_TOKEN_TTL_SECONDS}
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def get_optional_user_id(authorization: Optional[str] = Header(None)) -> Optional[int]:
+    """Returns the user id from a Bearer token, or None when no token is sent."""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        return int(payload["sub"])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token has expired")
+    except (jwt.InvalidTokenError, KeyError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+def build_update_statements(table: str, columns: tuple, key_column: str) -> Dict[tuple, str]:
     """
-    return hash_password(plain_password) == hashed_password
+    Precomputes the UPDATE for every non-empty subset of columns, keyed by a
+    tuple of which columns are being set, so handlers never assemble SQL.
+    """
+    statements = {}
+    for flags in itertools.product((True, False), repeat=len(columns)):
+        chosen = [column for column, is_set in zip(columns, flags) if is_set]
+        if chosen:
+            set_clause = ", ".join(f"{column} = ?" for column in chosen)
+            statements[flags] = f"UPDATE {table} SET {set_clause}, updated_at = {SQL_NOW} WHERE {key_column} = ?"
+    return statements
+
+USER_UPDATE_SQL = build_update_statements("users", ("username", "email"), "user_id")
+GROUP_UPDATE_SQL = build_update_statements("groups", ("group_name", "group_description"), "group_id")
+
+# Groups with their member ids aggregated in the same statement (one round trip, no N+1)
+GROUPS_WITH_MEMBERS_SQL = """
+    SELECT g.*, GROUP_CONCAT(gm.user_id) AS member_ids
+    FROM groups g
+    LEFT JOIN group_members gm ON gm.group_id = g.group_id
+    {where}
+    GROUP BY g.group_id
+"""
+
+# Response models below are built with model_construct: the values come from typed
+# columns we wrote ourselves, so only the DATETIME text needs converting.
+def group_from_row(row: sqlite3.Row) -> "Group":
+    """Builds a Group from a GROUPS_WITH_MEMBERS_SQL row."""
+    return Group.model_construct(
+        group_id=row["group_id"],
+        group_name=row["group_name"],
+        group_description=row["group_description"],
+        created_by_user_id=row["created_by_user_id"],
+        created_at=datetime.fromisoformat(row["created_at"]),
+        updated_at=datetime.fromisoformat(row["updated_at"]),
+        members=[int(member_id) for member_id in (row["member_ids"] or "").split(",") if member_id]
+    )
 
-def generate_token() -> str:
-    """Generates a secure random token."""
-    return secrets.token_urlsafe(32)
+# Message columns aliased to the Message field names
+MESSAGE_COLUMNS = (
+    "message_id, group_id, sender_user_id AS sender_id, message_text AS content, "
+    "media_url, media_type, sent_at AS timestamp"
+)
+
+def message_from_row(row: sqlite3.Row) -> "Message":
+    """Builds a Message from a MESSAGE_COLUMNS row."""
+    fields = dict(row)
+    fields["timestamp"] = datetime.fromisoformat(fields["timestamp"])
+    return Message.model_construct(**fields)
+
+USER_PROFILE_COLUMNS = "user_id, username, email, created_at"
+
+def user_profile_from_row(row: sqlite3.Row) -> "UserProfile":
+    """Builds a UserProfile from a USER_PROFILE_COLUMNS row."""
+    return UserProfile.model_construct(
+        user_id=str(row["user_id"]),
+        username=row["username"],
+        email=row["email"],
+        created_at=datetime.fromisoformat(row["created_at"])
+    )
+
+# Positive membership checks only, kept per user: user_id -> {group_id: (expiry, group_epoch)}.
+# Invalidation is O(1): removing a member or deleting a user drops that user's
+# entries and bumps the user's epoch; deleting a group bumps the group's epoch,
+# which makes every cached entry for it stale. A lookup that raced with an
+# invalidation sees a changed epoch and doesn't cache its result. The cache is
+# per process: with several uvicorn workers, a removal handled by one worker
+# leaves the others accepting that member's messages for up to the TTL.
+MEMBERSHIP_CACHE_TTL_SECONDS = 300
+MEMBERSHIP_CACHE_MAX_USERS = 10_000
+_membership_cache: Dict[int, Dict[int, tuple]] = {}
+_user_epochs: Dict[int, int] = {}
+_group_epochs: Dict[int, int] = {}
+_membership_cache_lock = threading.Lock()
+
+def is_group_member(cursor: sqlite3.Cursor, group_id: int, user_id: int) -> bool:
+    """Returns True if the group exists and the user belongs to it, using the cache when possible."""
+    now = time.monotonic()
+    with _membership_cache_lock:
+        entry = _membership_cache.get(user_id, {}).get(group_id)
+        group_epoch = _group_epochs.get(group_id, 0)
+        user_epoch = _user_epochs.get(user_id, 0)
+    if entry is not None and entry[0] > now and entry[1] == group_epoch:
+        return True
+    # Joined on groups because memberships of deleted groups are not cascaded away
+    cursor.execute(
+        "SELECT 1 FROM group_members gm JOIN groups g ON g.group_id = gm.group_id "
+        "WHERE gm.group_id = ? AND gm.user_id = ?",
+        (group_id, user_id)
+    )
+    if cursor.fetchone() is None:
+        return False
+    with _membership_cache_lock:
+        # Skip caching if the user or group was invalidated while we were querying
+        if _user_epochs.get(user_id, 0) == user_epoch and _group_epochs.get(group_id, 0) == group_epoch:
+            groups = _membership_cache.get(user_id)
+            if groups is None:
+                if len(_membership_cache) >= MEMBERSHIP_CACHE_MAX_USERS:
+                    del _membership_cache[next(iter(_membership_cache))]
+                groups = _membership_cache[user_id] = {}
+            groups[group_id] = (now + MEMBERSHIP_CACHE_TTL_SECONDS, group_epoch)
+    return True
+
+def forget_memberships(group_id: Optional[int] = None, user_id: Optional[int] = None):
+    """Invalidates cached memberships of a user, of a group, or of one user in one group."""
+    with _membership_cache_lock:
+        if user_id is not None:
+            _user_epochs[user_id] = _user_epochs.get(user_id, 0) + 1
+            if group_id is None:
+                _membership_cache.pop(user_id, None)
+            else:
+                _membership_cache.get(user_id, {}).pop(group_id, None)
+        elif group_id is not None:
+            _group_epochs[group_id] = _group_epochs.get(group_id, 0) + 1
+
+def fetch_group_with_members(cursor: sqlite3.Cursor, group_id: int) -> Optional["Group"]:
+    """Fetches one group and its member ids, or None if it doesn't exist."""
+    cursor.execute(GROUPS_WITH_MEMBERS_SQL.format(where="WHERE g.group_id = ?"), (group_id,))
+    row = cursor.fetchone()
+    return group_from_row(row) if row else None
 
 # --- API Routes ---
 
 # User Routes
 @app.post("/api/users/register", response_model=Dict[str, str])
-async def register_user(user: UserCreate):
+def register_user(user: UserCreate):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
@@ -238,7 +522,7 @@ async def register_user(user: UserCreate):
         conn.close()
 
 @app.post("/api/users/login", response_model=Dict[str, str])
-async def login_user(user: UserLogin):
+def login_user(user: UserLogin):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users WHERE email = ?", (user.email,))
@@ -251,71 +535,65 @@ async def login_user(user: UserLogin):
     if not verify_password(user.password, user_db["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    # In a real app, you'd generate a JWT here and return it.
-    # For simplicity, we'll just return a placeholder token.
-    # You might also store a refresh token in the auth_tokens table.
-    token = generate_token()
+    # Lazily upgrade legacy or outdated hashes now that we have the plaintext
+    if password_needs_rehash(user_db["password_hash"]):
+        conn = get_db_connection()
+        try:
+            conn.execute(
+                f"UPDATE users SET password_hash = ?, updated_at = {SQL_NOW} WHERE user_id = ?",
+                (hash_password(user.password), user_db["user_id"])
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    # Stateless JWT: nothing is written per login or read per request.
+    # auth_tokens stays available for refresh tokens/revocation if needed.
+    token = create_access_token(user_db["user_id"])
     return {"token": token}
 
 @app.get("/api/users/{user_id}", response_model=UserProfile)
-async def get_user_profile(user_id: int):
+def get_user_profile(user_id: int):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT user_id, username, email, created_at FROM users WHERE user_id = ?", (user_id,))
+    cursor.execute(f"SELECT {USER_PROFILE_COLUMNS} FROM users WHERE user_id = ?", (user_id,))
     user_db = cursor.fetchone()
     conn.close()
 
     if not user_db:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return UserProfile(
-        user_id=str(user_db["user_id"]),
-        username=user_db["username"],
-        email=user_db["email"],
-        created_at=user_db["created_at"]
-    )
+    return user_profile_from_row(user_db)
 
 @app.put("/api/users/{user_id}", response_model=Dict[str, Any])
-async def update_user_profile(user_id: int, user_update: UserUpdate):
+def update_user_profile(user_id: int, user_update: UserUpdate):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    updates = []
-    params = []
-
-    if user_update.username is not None:
-        updates.append("username = ?")
-        params.append(user_update.username)
-    if user_update.email is not None:
-        updates.append("email = ?")
-        params.append(user_update.email)
-
-    if not updates:
+    fields = (user_update.username, user_update.email)
+    query = USER_UPDATE_SQL.get(tuple(value is not None for value in fields))
+    if query is None:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    params.append(datetime.now()) # updated_at
-    params.append(user_id)
-
-    query = f"UPDATE users SET {', '.join(updates)}, updated_at = ? WHERE user_id = ?"
+    params = tuple(value for value in fields if value is not None) + (user_id,)
     try:
-        cursor.execute(query, tuple(params))
-        conn.commit()
-
-        if cursor.rowcount == 0:
+        if SQLITE_SUPPORTS_RETURNING:
+            cursor.execute(f"{query} RETURNING {USER_PROFILE_COLUMNS}", params)
+            updated_user_db = cursor.fetchone()
+            conn.commit()
+        else:
+            cursor.execute(query, params)
+            conn.commit()
+            # Fetch the updated user to return
+            cursor.execute(f"SELECT {USER_PROFILE_COLUMNS} FROM users WHERE user_id = ?", (user_id,))
+            updated_user_db = cursor.fetchone()
+
+        if updated_user_db is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Fetch the updated user to return
-        cursor.execute("SELECT user_id, username, email, created_at FROM users WHERE user_id = ?", (user_id,))
-        updated_user_db = cursor.fetchone()
-
         return {
             "message": "User profile updated successfully",
-            "updated_user": UserProfile(
-                user_id=str(updated_user_db["user_id"]),
-                username=updated_user_db["username"],
-                email=updated_user_db["email"],
-                created_at=updated_user_db["created_at"]
-            )
+            "updated_user": user_profile_from_row(updated_user_db)
         }
     except sqlite3.IntegrityError:
         conn.rollback()
@@ -324,12 +602,13 @@ async def update_user_profile(user_id: int, user_update: UserUpdate):
         conn.close()
 
 @app.delete("/api/users/{user_id}", response_model=Dict[str, str])
-async def delete_user_account(user_id: int):
+def delete_user_account(user_id: int):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
         conn.commit()
+        forget_memberships(user_id=user_id)
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="User not found")
         return {"message": "User account deleted successfully"}
@@ -338,7 +617,7 @@ async def delete_user_account(user_id: int):
 
 # Group Routes
 @app.post("/api/groups", response_model=Group)
-async def create_group(group_create: GroupCreate):
+def create_group(group_create: GroupCreate):
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -359,15 +638,14 @@ async def create_group(group_create: GroupCreate):
         # For now, let's require at least one member (the creator).
         raise HTTPException(status_code=400, detail="Group must have at least one member (creator)")
 
-    # Verify creator exists
-    cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (creator_id,))
-    if not cursor.fetchone():
+    # Verify the creator and all other members exist with a single IN lookup
+    placeholders = ",".join("?" * len(group_create.member_ids))
+    cursor.execute(f"SELECT user_id FROM users WHERE user_id IN ({placeholders})", group_create.member_ids)
+    existing_ids = {row["user_id"] for row in cursor}
+    if creator_id not in existing_ids:
         raise HTTPException(status_code=404, detail=f"Creator user with ID {creator_id} not found")
-
-    # Verify all other members exist
     for member_id in group_create.member_ids:
-        cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (member_id,))
-        if not cursor.fetchone():
+        if member_id not in existing_ids:
             raise HTTPException(status_code=404, detail=f"Member user with ID {member_id} not found")
 
     try:
@@ -378,31 +656,15 @@ async def create_group(group_create: GroupCreate):
         group_id = cursor.lastrowid
 
         # Add members to the group_members table
-        for member_id in group_create.member_ids:
-            cursor.execute(
-                "INSERT INTO group_members (group_id, user_id) VALUES (?, ?)",
-                (group_id, member_id)
-            )
+        cursor.executemany(
+            "INSERT INTO group_members (group_id, user_id) VALUES (?, ?)",
+            [(group_id, member_id) for member_id in group_create.member_ids]
+        )
 
         conn.commit()
 
-        # Fetch the created group to return
-        cursor.execute("SELECT * FROM groups WHERE group_id = ?", (group_id,))
-        created_group_db = cursor.fetchone()
-
-        # Fetch members for the response
-        cursor.execute("SELECT user_id FROM group_members WHERE group_id = ?", (group_id,))
-        members_db = [row["user_id"] for row in cursor.fetchall()]
-
-        return Group(
-            group_id=created_group_db["group_id"],
-            group_name=created_group_db["group_name"],
-            group_description=created_group_db["group_description"],
-            created_by_user_id=created_group_db["created_by_user_id"],
-            created_at=created_group_db["created_at"],
-            updated_at=created_group_db["updated_at"],
-            members=members_db
-        )
+        # Fetch the created group and its members to return
+        return fetch_group_with_members(cursor, group_id)
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Error creating group: {e}")
@@ -410,110 +672,59 @@ async def create_group(group_create: GroupCreate):
         conn.close()
 
 @app.get("/api/groups/{group_id}", response_model=Group)
-async def get_group_details(group_id: int):
+def get_group_details(group_id: int):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute("SELECT * FROM groups WHERE group_id = ?", (group_id,))
-    group_db = cursor.fetchone()
+    group = fetch_group_with_members(cursor, group_id)
+    conn.close()
 
-    if not group_db:
+    if not group:
         raise HTTPException(status_code=404, detail="Group not found")
 
-    cursor.execute("SELECT user_id FROM group_members WHERE group_id = ?", (group_id,))
-    members_db = [row["user_id"] for row in cursor.fetchall()]
-
-    conn.close()
-
-    return Group(
-        group_id=group_db["group_id"],
-        group_name=group_db["group_name"],
-        group_description=group_db["group_description"],
-        created_by_user_id=group_db["created_by_user_id"],
-        created_at=group_db["created_at"],
-        updated_at=group_db["updated_at"],
-        members=members_db
-    )
+    return group
 
 @app.get("/api/groups", response_model=Dict[str, List[Group]])
-async def get_all_groups(user_id: Optional[int] = None):
+def get_all_groups(user_id: Optional[int] = None):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    query = "SELECT g.* FROM groups g"
-    params = []
-
     if user_id is not None:
-        query += " JOIN group_members gm ON g.group_id = gm.group_id WHERE gm.user_id = ?"
-        params.append(user_id)
-
-    cursor.execute(query, tuple(params))
-    groups_db = cursor.fetchall()
-
-    all_groups_data = []
-    for group_db in groups_db:
-        cursor.execute("SELECT user_id FROM group_members WHERE group_id = ?", (group_db["group_id"],))
-        members_db = [row["user_id"] for row in cursor.fetchall()]
-        all_groups_data.append(Group(
-            group_id=group_db["group_id"],
-            group_name=group_db["group_name"],
-            group_description=group_db["group_description"],
-            created_by_user_id=group_db["created_by_user_id"],
-            created_at=group_db["created_at"],
-            updated_at=group_db["updated_at"],
-            members=members_db
-        ))
+        # Filter on membership without narrowing the aggregated member list
+        query = GROUPS_WITH_MEMBERS_SQL.format(
+            where="WHERE g.group_id IN (SELECT group_id FROM group_members WHERE user_id = ?)"
+        )
+        cursor.execute(query, (user_id,))
+    else:
+        cursor.execute(GROUPS_WITH_MEMBERS_SQL.format(where=""))
+
+    all_groups_data = [group_from_row(row) for row in cursor]
 
     conn.close()
     return {"groups": all_groups_data}
 
 @app.put("/api/groups/{group_id}", response_model=Dict[str, Any])
-async def update_group_details(group_id: int, group_update: GroupUpdate):
+def update_group_details(group_id: int, group_update: GroupUpdate):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    updates = []
-    params = []
-
-    if group_update.name is not None:
-        updates.append("group_name = ?")
-        params.append(group_update.name)
-    if group_update.description is not None:
-        updates.append("group_description = ?")
-        params.append(group_update.description)
-
-    if not updates:
+    fields = (group_update.name, group_update.description)
+    query = GROUP_UPDATE_SQL.get(tuple(value is not None for value in fields))
+    if query is None:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    params.append(datetime.now()) # updated_at
-    params.append(group_id)
-
-    query = f"UPDATE groups SET {', '.join(updates)}, updated_at = ? WHERE group_id = ?"
+    params = tuple(value for value in fields if value is not None) + (group_id,)
     try:
-        cursor.execute(query, tuple(params))
+        cursor.execute(query, params)
         conn.commit()
 
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Group not found")
 
-        # Fetch the updated group to return
-        cursor.execute("SELECT * FROM groups WHERE group_id = ?", (group_id,))
-        updated_group_db = cursor.fetchone()
-
-        cursor.execute("SELECT user_id FROM group_members WHERE group_id = ?", (group_id,))
-        members_db = [row["user_id"] for row in cursor.fetchall()]
-
+        # Fetch the updated group and its members to return
         return {
             "message": "Group details updated successfully",
-            "updated_group": Group(
-                group_id=updated_group_db["group_id"],
-                group_name=updated_group_db["group_name"],
-                group_description=updated_group_db["group_description"],
-                created_by_user_id=updated_group_db["created_by_user_id"],
-                created_at=updated_group_db["created_at"],
-                updated_at=updated_group_db["updated_at"],
-                members=members_db
-            )
+            "updated_group": fetch_group_with_members(cursor, group_id)
         }
     except Exception as e:
         conn.rollback()
@@ -522,12 +733,13 @@ async def update_group_details(group_id: int, group_update: GroupUpdate):
         conn.close()
 
 @app.delete("/api/groups/{group_id}", response_model=Dict[str, str])
-async def delete_group(group_id: int):
+def delete_group(group_id: int):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM groups WHERE group_id = ?", (group_id,))
         conn.commit()
+        forget_memberships(group_id=group_id)
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Group not found")
         return {"message": "Group deleted successfully"}
@@ -535,7 +747,7 @@ async def delete_group(group_id: int):
         conn.close()
 
 @app.post("/api/groups/{group_id}/members", response_model=Dict[str, Any])
-async def add_member_to_group(group_id: int, member_add: GroupMemberAdd):
+def add_member_to_group(group_id: int, member_add: GroupMemberAdd):
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -558,7 +770,7 @@ async def add_member_to_group(group_id: int, member_add: GroupMemberAdd):
 
         # Fetch updated members
         cursor.execute("SELECT user_id FROM group_members WHERE group_id = ?", (group_id,))
-        updated_members_db = [row["user_id"] for row in cursor.fetchall()]
+        updated_members_db = [row["user_id"] for row in cursor]
 
         return {
             "message": "Member added to group successfully",
@@ -575,7 +787,7 @@ async def add_member_to_group(group_id: int, member_add: GroupMemberAdd):
         conn.close()
 
 @app.delete("/api/groups/{group_id}/members/{user_id}", response_model=Dict[str, Any])
-async def remove_member_from_group(group_id: int, user_id: int):
+def remove_member_from_group(group_id: int, user_id: int):
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -593,10 +805,11 @@ async def remove_member_from_group(group_id: int, user_id: int):
     try:
         cursor.execute("DELETE FROM group_members WHERE group_id = ? AND user_id = ?", (group_id, user_id))
         conn.commit()
+        forget_memberships(group_id=group_id, user_id=user_id)
 
         # Fetch updated members
         cursor.execute("SELECT user_id FROM group_members WHERE group_id = ?", (group_id,))
-        updated_members_db = [row["user_id"] for row in cursor.fetchall()]
+        updated_members_db = [row["user_id"] for row in cursor]
 
         return {
             "message": "Member removed from group successfully",
@@ -609,122 +822,177 @@ async def remove_member_from_group(group_id: int, user_id: int):
     finally:
         conn.close()
 
-@app.get("/api/groups/{group_id}/messages", response_model=Dict[str, Any])
-async def get_group_messages(group_id: int, limit: Optional[int] = 20, offset: Optional[int] = 0):
+# Typed response model so FastAPI serializes the page straight to JSON bytes in pydantic-core
+@app.get("/api/groups/{group_id}/messages", response_model=MessagePage)
+def get_group_messages(
+    group_id: int,
+    limit: Optional[int] = 20,
+    offset: Optional[int] = 0,
+    before: Optional[str] = None,
+    before_id: Optional[int] = None
+):
+    """
+    Returns a group's messages, newest first. Pass the previous page's
+    next_cursor values as before/before_id for keyset pagination; offset
+    is still honoured when no cursor is given.
+    """
+    # A half-formed cursor must not silently fall back to the first page
+    if (before is None) != (before_id is None):
+        raise HTTPException(status_code=400, detail="before and before_id must be given together")
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # Check if group exists
-    cursor.execute("SELECT group_id FROM groups WHERE group_id = ?", (group_id,))
-    if not cursor.fetchone():
+    # Check the group exists and read its maintained message total in one query
+    cursor.execute("""
+        SELECT g.group_id, COALESCE(c.message_count, 0) AS message_count
+        FROM groups g
+        LEFT JOIN group_message_counts c ON c.group_id = g.group_id
+        WHERE g.group_id = ?
+    """, (group_id,))
+    group_row = cursor.fetchone()
+    if not group_row:
         raise HTTPException(status_code=404, detail="Group not found")
+    total_messages = group_row["message_count"]
 
-    # Get messages with pagination
-    cursor.execute(
-        "SELECT COUNT(*) FROM messages WHERE group_id = ?",
-        (group_id,)
-    )
-    total_messages = cursor.fetchone()[0]
-
-    cursor.execute(
-        "SELECT * FROM messages WHERE group_id = ? ORDER BY sent_at DESC LIMIT ? OFFSET ?",
-        (group_id, limit, offset)
-    )
+    if before is not None and before_id is not None:
+        cursor.execute(
+            f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE group_id = ? AND (sent_at, message_id) < (?, ?) "
+            "ORDER BY sent_at DESC, message_id DESC LIMIT ?",
+            (group_id, before, before_id, limit)
+        )
+    else:
+        cursor.execute(
+            f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE group_id = ? ORDER BY sent_at DESC, message_id DESC LIMIT ? OFFSET ?",
+            (group_id, limit, offset)
+        )
     messages_db = cursor.fetchall()
 
-    formatted_messages = []
-    for msg_db in messages_db:
-        formatted_messages.append(Message(
-            message_id=msg_db["message_id"],
-            group_id=msg_db["group_id"],
-            sender_id=msg_db["sender_user_id"],
-            content=msg_db["message_text"],
-            media_url=msg_db["media_url"],
-            media_type=msg_db["media_type"],
-            timestamp=msg_db["sent_at"]
-        ))
+    formatted_messages = [message_from_row(msg_db) for msg_db in messages_db]
 
     conn.close()
-    return {
-        "messages": formatted_messages,
-        "total_messages": total_messages
-    }
 
-@app.post("/api/messages", response_model=Message)
-async def send_message(message_create: MessageCreate):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Raw column values, so they compare exactly against sent_at on the next request
+    next_cursor = None
+    if messages_db and len(messages_db) == limit:
+        next_cursor = MessageCursor.model_construct(
+            before=messages_db[-1]["timestamp"], before_id=messages_db[-1]["message_id"]
+        )
+
+    return MessagePage.model_construct(
+        messages=formatted_messages,
+        total_messages=total_messages,
+        next_cursor=next_cursor
+    )
 
-    # In a real app, sender_id would come from authentication.
-    # For this example, we'll assume a sender_id is provided or we pick one.
-    # Let's require sender_id for now.
-    if not hasattr(message_create, 'sender_id') or message_create.sender_id is None:
+@app.post("/api/messages", response_model=Message)
+def send_message(message_create: MessageCreate, current_user_id: Optional[int] = Depends(get_optional_user_id)):
+    # The sender comes from the access token; an explicit sender_id must match it
+    if current_user_id is not None:
+        if message_create.sender_id is not None and message_create.sender_id != current_user_id:
+            raise HTTPException(status_code=403, detail="Sender ID must match the authenticated user")
+        message_create.sender_id = current_user_id
+    elif not ALLOW_UNAUTHENTICATED_SENDER:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if message_create.sender_id is None:
          raise HTTPException(status_code=400, detail="Sender ID is required")
 
-    # Check if group exists
-    cursor.execute("SELECT group_id FROM groups WHERE group_id = ?", (message_create.group_id,))
-    if not cursor.fetchone():
-        raise HTTPException(status_code=404, detail="Group not found")
+    conn = get_db_connection()
+    cursor = conn.cursor()
 
-    # Check if sender is a member of the group
-    cursor.execute("SELECT user_id FROM group_members WHERE group_id = ? AND user_id = ?", (message_create.group_id, message_create.sender_id))
-    if not cursor.fetchone():
+    # Check the sender is a member (cached); only on failure look up whether the group exists
+    if not is_group_member(cursor, message_create.group_id, message_create.sender_id):
+        cursor.execute("SELECT group_id FROM groups WHERE group_id = ?", (message_create.group_id,))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Group not found")
         raise HTTPException(status_code=403, detail="Sender is not a member of this group")
 
     try:
-        cursor.execute(
-            "INSERT INTO messages (group_id, sender_user_id, message_text, media_url, media_type) VALUES (?, ?, ?, ?, ?)",
-            (message_create.group_id, message_create.sender_id, message_create.content, message_create.media_url, message_create.media_type)
-        )
-        message_id = cursor.lastrowid
-        conn.commit()
-
-        # Fetch the created message to return
-        cursor.execute("SELECT * FROM messages WHERE message_id = ?", (message_id,))
-        created_message_db = cursor.fetchone()
-
-        return Message(
-            message_id=created_message_db["message_id"],
-            group_id=created_message_db["group_id"],
-            sender_id=created_message_db["sender_user_id"],
-            content=created_message_db["message_text"],
-            media_url=created_message_db["media_url"],
-            media_type=created_message_db["media_type"],
-            timestamp=created_message_db["sent_at"]
-        )
+        insert_sql = "INSERT INTO messages (group_id, sender_user_id, message_text, media_url, media_type) VALUES (?, ?, ?, ?, ?)"
+        params = (message_create.group_id, message_create.sender_id, message_create.content, message_create.media_url, message_create.media_type)
+        if SQLITE_SUPPORTS_RETURNING:
+            cursor.execute(f"{insert_sql} RETURNING {MESSAGE_COLUMNS}", params)
+            created_message_db = cursor.fetchone()
+            conn.commit()
+        else:
+            cursor.execute(insert_sql, params)
+            message_id = cursor.lastrowid
+            conn.commit()
+            # Fetch the created message to return
+            cursor.execute(f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE message_id = ?", (message_id,))
+            created_message_db = cursor.fetchone()
+
+        return message_from_row(created_message_db)
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Error sending message: {e}")
     finally:
         conn.close()
 
+UPLOAD_DIR = "uploads"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+def safe_upload_filename(filename: Optional[str]) -> str:
+    """Reduces a client-supplied filename to a bare name of safe characters."""
+    name = _UNSAFE_FILENAME_CHARS.sub("_", os.path.basename(filename or "")).lstrip(".")
+    return name or "upload"
+
+def create_upload_file(upload_dir: str, file_name: str):
+    """
+    Opens a new file for writing without ever replacing an existing upload, so a
+    media URL always refers to the same bytes. On a name clash a random suffix is added.
+    Returns (file_name, file_object).
+    """
+    stem, ext = os.path.splitext(file_name)
+    candidate = file_name
+    while True:
+        try:
+            return candidate, open(os.path.join(upload_dir, candidate), "xb")
+        except FileExistsError:
+            candidate = f"{stem}-{secrets.token_hex(4)}{ext}"
+
 @app.post("/api/media/upload", response_model=MediaUploadResponse)
-async def upload_media(file: UploadFile = File(...)):
+def upload_media(file: UploadFile = File(...)):
     # In a real application, you would upload this file to a cloud storage service
     # like AWS S3, Google Cloud Storage, or a dedicated media server.
     # For this example, we'll just save it locally and return a placeholder URL.
 
     # Create a directory for uploads if it doesn't exist
-    upload_dir = "uploads"
-    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-    file_location = os.path.join(upload_dir, file.filename)
-    with open(file_location, "wb+") as file_object:
-        file_object.write(file.file.read())
+    # Never let the client's filename choose a path outside UPLOAD_DIR
+    file_name, file_object = create_upload_file(UPLOAD_DIR, safe_upload_filename(file.filename))
+    # Copy in fixed-size chunks so memory use doesn't grow with the upload size
+    with file_object:
+        shutil.copyfileobj(file.file, file_object, length=UPLOAD_CHUNK_SIZE)
 
     # Generate a placeholder URL. In a real app, this would be a URL to your cloud storage.
-    media_url = f"http://localhost:8080/static/{file.filename}" # Assuming static files are served
+    media_url = f"http://localhost:8080/static/{file_name}" # Assuming static files are served
 
     return MediaUploadResponse(
         media_url=media_url,
-        file_name=file.filename,
+        file_name=file_name,
         file_type=file.content_type
     )
 
 # --- Static File Serving (for media uploads) ---
-# This is a basic setup. For production, use a more robust static file server.
+# Fine for development. In production set SERVE_UPLOADS=0 and let nginx/Caddy serve
+# /static/ straight from the uploads directory (with the same Cache-Control), so
+# media bytes go from the page cache to the socket without passing through Python.
 from fastapi.staticfiles import StaticFiles
-app.mount("/static", StaticFiles(directory="uploads"), name="static")
+
+# Uploads are never overwritten (see create_upload_file), so clients may cache them forever
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+class MediaStaticFiles(StaticFiles):
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = MEDIA_CACHE_CONTROL
+        return response
+
+if os.environ.get("SERVE_UPLOADS", "1") != "0":
+    app.mount("/static", MediaStaticFiles(directory=UPLOAD_DIR), name="static")
 
 
 # --- Main Execution ---
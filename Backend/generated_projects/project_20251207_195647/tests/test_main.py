@@ -1,11 +1,13 @@
 import pytest
 import sqlite3
 import os
+import uuid
+import hashlib
 from fastapi.testclient import TestClient
 from datetime import datetime, timedelta
 
 # Import the FastAPI app and database functions from your main.py
-from main import app, get_db_connection, DATABASE_NAME, init_db
+from main import app, get_db_connection, DATABASE_NAME, init_db, is_group_member
 
 # --- Pytest Fixtures ---
 
@@ -97,6 +99,52 @@ def create_group(client, create_user):
         "members": members_db
     }
 
+@pytest.fixture(scope="function")
+def auth_headers(client, create_user):
+    """Logs create_user in and returns the Authorization header for their token."""
+    response = client.post("/api/users/login", json={"email": create_user["email"], "password": create_user["password"]})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+@pytest.fixture(scope="function")
+def auth_user(client):
+    """Registers a uniquely named user, logs them in and returns their id and auth headers."""
+    suffix = uuid.uuid4().hex[:12]
+    user_data = {
+        "username": f"user_{suffix}",
+        "email": f"user_{suffix}@example.com",
+        "password": "password123"
+    }
+    response = client.post("/api/users/register", json=user_data)
+    assert response.status_code == 200
+    login_response = client.post("/api/users/login", json={"email": user_data["email"], "password": user_data["password"]})
+    assert login_response.status_code == 200
+    return {
+        "user_id": int(response.json()["user_id"]),
+        "email": user_data["email"],
+        "password": user_data["password"],
+        "headers": {"Authorization": f"Bearer {login_response.json()['token']}"}
+    }
+
+@pytest.fixture(scope="function")
+def auth_group(client, auth_user):
+    """Creates a uniquely named group whose only member is auth_user."""
+    group_data = {
+        "name": f"Group {uuid.uuid4().hex[:12]}",
+        "member_ids": [auth_user["user_id"]]
+    }
+    response = client.post("/api/groups", json=group_data)
+    assert response.status_code == 200
+    return response.json()
+
+def send_as(client, user, group_id, content):
+    """Sends a message as an authenticated user and returns the response."""
+    return client.post(
+        "/api/messages",
+        json={"group_id": group_id, "sender_id": user["user_id"], "content": content},
+        headers=user["headers"]
+    )
+
 # --- User API Tests ---
 
 def test_register_user_success(client, db_cursor):
@@ -190,6 +238,41 @@ def test_login_user_wrong_password(client, create_user):
     assert response.status_code == 401
     assert "Invalid credentials" in response.json()["detail"]
 
+def test_login_legacy_sha256_hash_is_upgraded(client, db_cursor):
+    """Tests that a legacy SHA-256 hash still logs in and is rehashed with Argon2id."""
+    suffix = uuid.uuid4().hex[:12]
+    email = f"legacy_{suffix}@example.com"
+    db_cursor.execute(
+        "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+        (f"legacy_{suffix}", email, hashlib.sha256(b"oldpassword").hexdigest())
+    )
+    db_cursor.connection.commit()
+
+    response = client.post("/api/users/login", json={"email": email, "password": "oldpassword"})
+    assert response.status_code == 200
+    assert "token" in response.json()
+
+    db_cursor.execute("SELECT password_hash FROM users WHERE email = ?", (email,))
+    assert db_cursor.fetchone()["password_hash"].startswith("$argon2id$")
+
+    # The upgraded hash keeps working, and the old password is still the only valid one
+    assert client.post("/api/users/login", json={"email": email, "password": "oldpassword"}).status_code == 200
+    assert client.post("/api/users/login", json={"email": email, "password": "wrongpassword"}).status_code == 401
+
+def test_login_malformed_stored_hash(client, db_cursor):
+    """Tests that a corrupt stored hash is treated as invalid credentials, not a server error."""
+    suffix = uuid.uuid4().hex[:12]
+    email = f"corrupt_{suffix}@example.com"
+    db_cursor.execute(
+        "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+        (f"corrupt_{suffix}", email, "$argon2id$v=19$not-a-real-hash")
+    )
+    db_cursor.connection.commit()
+
+    response = client.post("/api/users/login", json={"email": email, "password": "anything"})
+    assert response.status_code == 401
+    assert "Invalid credentials" in response.json()["detail"]
+
 def test_get_user_profile_success(client, create_user):
     """Tests retrieving a user's profile."""
     response = client.get(f"/api/users/{create_user['user_id']}")
@@ -520,14 +603,14 @@ def test_remove_member_from_group_group_not_found(client, create_user):
 
 # --- Message API Tests ---
 
-def test_send_message_success(client, create_user, create_group):
+def test_send_message_success(client, create_user, create_group, auth_headers):
     """Tests successfully sending a text message."""
     message_data = {
         "group_id": create_group["group_id"],
         "sender_id": create_user["user_id"],
         "content": "Hello, this is a test message!"
     }
-    response = client.post("/api/messages", json=message_data)
+    response = client.post("/api/messages", json=message_data, headers=auth_headers)
     assert response.status_code == 200
     message = response.json()
 
@@ -539,7 +622,7 @@ def test_send_message_success(client, create_user, create_group):
     assert "message_id" in message
     assert "timestamp" in message
 
-def test_send_message_with_media(client, create_user, create_group):
+def test_send_message_with_media(client, create_user, create_group, auth_headers):
     """Tests sending a message with media URL and type."""
     message_data = {
         "group_id": create_group["group_id"],
@@ -548,7 +631,7 @@ def test_send_message_with_media(client, create_user, create_group):
         "media_url": "http://example.com/images/test.jpg",
         "media_type": "image"
     }
-    response = client.post("/api/messages", json=message_data)
+    response = client.post("/api/messages", json=message_data, headers=auth_headers)
     assert response.status_code == 200
     message = response.json()
 
@@ -558,14 +641,14 @@ def test_send_message_with_media(client, create_user, create_group):
     assert message["media_url"] == message_data["media_url"]
     assert message["media_type"] == message_data["media_type"]
 
-def test_send_message_group_not_found(client, create_user):
+def test_send_message_group_not_found(client, create_user, auth_headers):
     """Tests sending a message to a non-existent group."""
     message_data = {
         "group_id": 99999,
         "sender_id": create_user["user_id"],
         "content": "This should fail"
     }
-    response = client.post("/api/messages", json=message_data)
+    response = client.post("/api/messages", json=message_data, headers=auth_headers)
     assert response.status_code == 404
     assert "Group not found" in response.json()["detail"]
 
@@ -580,27 +663,96 @@ def test_send_message_sender_not_in_group(client, create_user, create_group):
     register_response = client.post("/api/users/register", json=user_data_outsider)
     assert register_response.status_code == 200
     outsider_id = int(register_response.json()["user_id"])
+    login_response = client.post("/api/users/login", json={"email": user_data_outsider["email"], "password": user_data_outsider["password"]})
+    outsider_headers = {"Authorization": f"Bearer {login_response.json()['token']}"}
 
     message_data = {
         "group_id": create_group["group_id"],
         "sender_id": outsider_id,
         "content": "I'm not in this group!"
     }
-    response = client.post("/api/messages", json=message_data)
+    response = client.post("/api/messages", json=message_data, headers=outsider_headers)
     assert response.status_code == 403
     assert "Sender is not a member of this group" in response.json()["detail"]
 
-def test_send_message_missing_sender_id(client, create_group):
-    """Tests sending a message without a sender_id."""
+def test_send_message_uses_token_sender(client, auth_user, auth_group):
+    """Tests that a message without sender_id is sent as the token's user."""
     message_data = {
-        "group_id": create_group["group_id"],
-        "content": "Missing sender"
+        "group_id": auth_group["group_id"],
+        "content": "Sender from token"
+    }
+    response = client.post("/api/messages", json=message_data, headers=auth_user["headers"])
+    assert response.status_code == 200
+    assert response.json()["sender_id"] == auth_user["user_id"]
+
+def test_send_message_mismatched_sender(client, auth_user, auth_group):
+    """Tests that a sender_id other than the token's user is rejected."""
+    message_data = {
+        "group_id": auth_group["group_id"],
+        "sender_id": auth_user["user_id"] + 1,
+        "content": "Impersonation"
+    }
+    response = client.post("/api/messages", json=message_data, headers=auth_user["headers"])
+    assert response.status_code == 403
+
+def test_send_message_after_member_removed(client, auth_user, auth_group):
+    """Tests that a removed member can no longer send, even after a cached successful send."""
+    assert send_as(client, auth_user, auth_group["group_id"], "Before removal").status_code == 200
+
+    response = client.delete(f"/api/groups/{auth_group['group_id']}/members/{auth_user['user_id']}")
+    assert response.status_code == 200
+
+    response = send_as(client, auth_user, auth_group["group_id"], "After removal")
+    assert response.status_code == 403
+    assert "Sender is not a member of this group" in response.json()["detail"]
+
+def test_membership_cache_ignores_lookup_raced_by_removal(client, auth_user, auth_group):
+    """Tests that a membership read just before a removal is not cached after it."""
+    group_id, user_id = auth_group["group_id"], auth_user["user_id"]
+
+    class RemovalDuringLookup:
+        """Cursor that removes the member right after the membership row is read."""
+        def __init__(self, cursor):
+            self.cursor = cursor
+
+        def execute(self, *args):
+            return self.cursor.execute(*args)
+
+        def fetchone(self):
+            row = self.cursor.fetchone()
+            response = client.delete(f"/api/groups/{group_id}/members/{user_id}")
+            assert response.status_code == 200
+            return row
+
+    conn = get_db_connection()
+    try:
+        assert is_group_member(RemovalDuringLookup(conn.cursor()), group_id, user_id)
+    finally:
+        conn.close()
+
+    response = send_as(client, auth_user, group_id, "After racing removal")
+    assert response.status_code == 403
+
+def test_send_message_missing_token(client, auth_user, auth_group):
+    """Tests that a message without an access token is rejected, even with a sender_id."""
+    message_data = {
+        "group_id": auth_group["group_id"],
+        "sender_id": auth_user["user_id"],
+        "content": "No token"
     }
     response = client.post("/api/messages", json=message_data)
-    assert response.status_code == 400
-    assert "Sender ID is required" in response.json()["detail"]
+    assert response.status_code == 401
+
+def test_send_message_invalid_token(client, auth_user, auth_group):
+    """Tests that a malformed access token is rejected."""
+    message_data = {
+        "group_id": auth_group["group_id"],
+        "content": "Bad token"
+    }
+    response = client.post("/api/messages", json=message_data, headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.status_code == 401
 
-def test_get_group_messages_success(client, create_user, create_group, db_cursor):
+def test_get_group_messages_success(client, create_user, create_group, db_cursor, auth_headers):
     """Tests retrieving messages from a group."""
     # Send a few messages
     message1_data = {
@@ -608,14 +760,14 @@ def test_get_group_messages_success(client, create_user, create_group, db_cursor
         "sender_id": create_user["user_id"],
         "content": "First message"
     }
-    client.post("/api/messages", json=message1_data)
+    client.post("/api/messages", json=message1_data, headers=auth_headers)
 
     message2_data = {
         "group_id": create_group["group_id"],
         "sender_id": create_user["user_id"],
         "content": "Second message"
     }
-    client.post("/api/messages", json=message2_data)
+    client.post("/api/messages", json=message2_data, headers=auth_headers)
 
     # Retrieve messages
     response = client.get(f"/api/groups/{create_group['group_id']}/messages")
@@ -629,7 +781,7 @@ def test_get_group_messages_success(client, create_user, create_group, db_cursor
     assert messages_data["messages"][0]["content"] == "Second message"
     assert messages_data["messages"][1]["content"] == "First message"
 
-def test_get_group_messages_pagination(client, create_user, create_group, db_cursor):
+def test_get_group_messages_pagination(client, create_user, create_group, db_cursor, auth_headers):
     """Tests retrieving messages with pagination."""
     # Send 5 messages
     for i in range(5):
@@ -638,7 +790,7 @@ def test_get_group_messages_pagination(client, create_user, create_group, db_cur
             "sender_id": create_user["user_id"],
             "content": f"Message {i+1}"
         }
-        client.post("/api/messages", json=message_data)
+        client.post("/api/messages", json=message_data, headers=auth_headers)
 
     # Retrieve with limit=2, offset=0
     response1 = client.get(f"/api/groups/{create_group['group_id']}/messages?limit=2&offset=0")
@@ -671,6 +823,37 @@ def test_get_group_messages_empty_group(client, create_group):
     assert len(messages_data["messages"]) == 0
     assert messages_data["total_messages"] == 0
 
+def test_get_group_messages_keyset_pages(client, auth_user, auth_group):
+    """Tests walking messages page by page with next_cursor."""
+    for i in range(5):
+        assert send_as(client, auth_user, auth_group["group_id"], f"Keyset {i+1}").status_code == 200
+
+    url = f"/api/groups/{auth_group['group_id']}/messages"
+    page1 = client.get(url, params={"limit": 2}).json()
+    assert [m["content"] for m in page1["messages"]] == ["Keyset 5", "Keyset 4"]
+    assert page1["next_cursor"] is not None
+
+    page2 = client.get(url, params={"limit": 2, **page1["next_cursor"]}).json()
+    assert [m["content"] for m in page2["messages"]] == ["Keyset 3", "Keyset 2"]
+
+    page3 = client.get(url, params={"limit": 2, **page2["next_cursor"]}).json()
+    assert [m["content"] for m in page3["messages"]] == ["Keyset 1"]
+    assert page3["next_cursor"] is None
+
+def test_get_group_messages_partial_cursor(client, auth_group):
+    """Tests that sending only half of a keyset cursor is rejected."""
+    url = f"/api/groups/{auth_group['group_id']}/messages"
+    assert client.get(url, params={"before": "2024-01-01 00:00:00"}).status_code == 400
+    assert client.get(url, params={"before_id": 1}).status_code == 400
+
+def test_get_group_messages_total_after_sends(client, auth_user, auth_group):
+    """Tests that total_messages tracks sends through the maintained counter."""
+    url = f"/api/groups/{auth_group['group_id']}/messages"
+    assert client.get(url).json()["total_messages"] == 0
+    for i in range(3):
+        send_as(client, auth_user, auth_group["group_id"], f"Count {i}")
+    assert client.get(url, params={"limit": 1}).json()["total_messages"] == 3
+
 def test_get_group_messages_group_not_found(client):
     """Tests retrieving messages from a non-existent group."""
     response = client.get("/api/groups/99999/messages")
@@ -744,7 +927,7 @@ def test_group_update_empty_payload(client, create_group):
     assert response.status_code == 400
     assert "No fields to update" in response.json()["detail"]
 
-def test_get_messages_with_large_limit_and_offset(client, create_user, create_group, db_cursor):
+def test_get_messages_with_large_limit_and_offset(client, create_user, create_group, db_cursor, auth_headers):
     """Tests retrieving messages with a very large limit and offset."""
     # Send a few messages
     for i in range(3):
@@ -753,7 +936,7 @@ def test_get_messages_with_large_limit_and_offset(client, create_user, create_gr
             "sender_id": create_user["user_id"],
             "content": f"Boundary message {i+1}"
         }
-        client.post("/api/messages", json=message_data)
+        client.post("/api/messages", json=message_data, headers=auth_headers)
 
     # Request more messages than exist with a large offset
     response = client.get(f"/api/groups/{create_group['group_id']}/messages?limit=100&offset=50")
@@ -6,7 +6,9 @@ Swapnil Nagras (26761683)
 
 FastAPI endpoints for the multi-agent system.
 """
+import logging
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from agents.orchestrator_agent import OrchestratorAgent
@@ -14,6 +16,7 @@ from tracking.usage_tracker import UsageTracker
 from utils.file_generator import FileGenerator
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Initialize orchestrator, usage tracker, and file generator
 orchestrator = OrchestratorAgent()
@@ -63,7 +66,8 @@ async def generate_software(request: SoftwareRequest):
         SoftwareResponse with architecture, code, and tests
     """
     try:
-        result = orchestrator.process({
+        # Run the blocking agent pipeline in the threadpool so it does not stall the event loop
+        result = await run_in_threadpool(orchestrator.process, {
             "description": request.description,
             "requirements": request.requirements or ""
         })
@@ -80,7 +84,8 @@ async def generate_software(request: SoftwareRequest):
         files = None
         if request.save_files:
             try:
-                file_info = file_generator.generate_project(
+                file_info = await run_in_threadpool(
+                    file_generator.generate_project,
                     architecture=architecture,
                     database_schema=database_schema,
                     code=code,
@@ -115,7 +120,7 @@ async def generate_software(request: SoftwareRequest):
                     files["test_file"] = file_info["test_file"]
             except Exception as file_error:
                 # Log error but don't fail the request
-                print(f"Warning: Failed to save files: {str(file_error)}")
+                logger.warning("Failed to save files: %s", file_error)
         
         return SoftwareResponse(
             architecture=architecture,
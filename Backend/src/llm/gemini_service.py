@@ -68,7 +68,7 @@ class GeminiService:
             for m in genai.list_models():
                 if 'generateContent' in m.supported_generation_methods:
                     # Extract just the model name (e.g., "models/gemini-1.5-flash" -> "gemini-1.5-flash")
-                    model_id = m.name.split('/')[-1] if '/' in m.name else m.name
+                    model_id = m.name.rpartition('/')[2]
                     available_models.append(model_id)
             
             raise ValueError(
@@ -118,15 +118,20 @@ class GeminiService:
                 generation_config=generation_config
             )
             
+            # Read the response text once; it is an accessor on the response object
+            text = response.text or ""
+            
             # Extract usage information
+            input_tokens = len(prompt.split())  # Approximate
+            output_tokens = len(text.split())  # Approximate
             usage_info = {
-                "input_tokens": len(prompt.split()),  # Approximate
-                "output_tokens": len(response.text.split()) if response.text else 0,  # Approximate
-                "total_tokens": len(prompt.split()) + (len(response.text.split()) if response.text else 0)
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens
             }
             
             return {
-                "text": response.text if response.text else "",
+                "text": text,
                 "usage": usage_info,
                 "agent_name": agent_name
             }
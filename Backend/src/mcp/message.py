@@ -9,7 +9,7 @@ Message types for MCP communication between agents.
 from typing import Dict, Any, Optional
 from enum import Enum
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class MessageType(str, Enum):
@@ -27,7 +27,7 @@ class MCPMessage(BaseModel):
     from_agent: str
     to_agent: str
     content: Dict[str, Any]
-    timestamp: datetime = datetime.utcnow()
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
     correlation_id: Optional[str] = None  # For linking requests and responses
 
 
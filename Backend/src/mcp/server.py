@@ -7,10 +7,14 @@ Swapnil Nagras (26761683)
 MCP Server for handling agent communication and tool execution.
 """
 import uuid
-from typing import Dict, Callable, Any, Optional
+from collections import deque
+from typing import Dict, Callable, Any, Optional, Deque
 from threading import Lock
 from mcp.message import MCPMessage, MCPRequest, MCPResponse, MessageType
 
+# Maximum number of undelivered messages kept per agent; the oldest are dropped first
+MAX_PENDING_MESSAGES = 1000
+
 
 class MCPServer:
     """MCP Server that handles agent communication and tool execution."""
@@ -19,7 +23,7 @@ class MCPServer:
         """Initialize the MCP server."""
         self.agents: Dict[str, 'MCPAgent'] = {}
         self.tools: Dict[str, Callable] = {}
-        self.message_queue: Dict[str, list] = {}  # Agent name -> list of messages
+        self.message_queue: Dict[str, Deque[MCPMessage]] = {}  # Agent name -> pending messages
         self.lock = Lock()
         self.message_handlers: Dict[str, Callable] = {}
     
@@ -33,7 +37,7 @@ class MCPServer:
         """
         with self.lock:
             self.agents[agent_name] = agent
-            self.message_queue[agent_name] = []
+            self.message_queue[agent_name] = deque(maxlen=MAX_PENDING_MESSAGES)
     
     def register_tool(self, tool_name: str, tool_function: Callable):
         """
@@ -59,7 +63,7 @@ class MCPServer:
         with self.lock:
             if message.to_agent not in self.agents:
                 error_response = MCPResponse(
-                    message_id=str(uuid.uuid4()),
+                    message_id=uuid.uuid4().hex,
                     from_agent=message.to_agent,
                     to_agent=message.from_agent,
                     content={},
@@ -72,12 +76,13 @@ class MCPServer:
             
             # Add message to recipient's queue
             self.message_queue[message.to_agent].append(message)
-            
-            # If it's a request, handle it immediately
-            if isinstance(message, MCPRequest):
-                return self._handle_request(message)
-            
-            return None
+        
+        # If it's a request, handle it immediately. Tools can block on LLM calls,
+        # so they run outside the lock to let concurrent requests proceed.
+        if isinstance(message, MCPRequest):
+            return self._handle_request(message)
+        
+        return None
     
     def _handle_request(self, request: MCPRequest) -> MCPResponse:
         """
@@ -91,12 +96,13 @@ class MCPServer:
         """
         try:
             # Try to find tool with agent prefix first, then without
-            tool_key = f"{request.to_agent}.{request.tool}"
-            if tool_key not in self.tools:
+            tool_function = self.tools.get(f"{request.to_agent}.{request.tool}")
+            if tool_function is None:
                 # Try without prefix
-                if request.tool not in self.tools:
+                tool_function = self.tools.get(request.tool)
+                if tool_function is None:
                     return MCPResponse(
-                        message_id=str(uuid.uuid4()),
+                        message_id=uuid.uuid4().hex,
                         from_agent=request.to_agent,
                         to_agent=request.from_agent,
                         content={},
@@ -105,15 +111,12 @@ class MCPServer:
                         success=False,
                         error_message=f"Tool {request.tool} not found for agent {request.to_agent}"
                     )
-                tool_function = self.tools[request.tool]
-            else:
-                tool_function = self.tools[tool_key]
             
             # Execute the tool
             result = tool_function(**request.parameters)
             
             return MCPResponse(
-                message_id=str(uuid.uuid4()),
+                message_id=uuid.uuid4().hex,
                 from_agent=request.to_agent,
                 to_agent=request.from_agent,
                 content={},
@@ -123,7 +126,7 @@ class MCPServer:
             )
         except Exception as e:
             return MCPResponse(
-                message_id=str(uuid.uuid4()),
+                message_id=uuid.uuid4().hex,
                 from_agent=request.to_agent,
                 to_agent=request.from_agent,
                 content={},
@@ -144,8 +147,11 @@ class MCPServer:
             List of pending messages
         """
         with self.lock:
-            messages = self.message_queue.get(agent_name, [])
-            self.message_queue[agent_name] = []  # Clear the queue
+            queue = self.message_queue.get(agent_name)
+            if not queue:
+                return []
+            messages = list(queue)
+            queue.clear()
             return messages
     
     def unregister_agent(self, agent_name: str):
@@ -156,10 +162,8 @@ class MCPServer:
             agent_name: Name of the agent to unregister
         """
         with self.lock:
-            if agent_name in self.agents:
-                del self.agents[agent_name]
-            if agent_name in self.message_queue:
-                del self.message_queue[agent_name]
+            self.agents.pop(agent_name, None)
+            self.message_queue.pop(agent_name, None)
 
 
 # Global MCP server instance
@@ -193,9 +197,8 @@ class MCPAgent:
         Returns:
             Result from the tool execution
         """
-        import uuid
         request = MCPRequest(
-            message_id=str(uuid.uuid4()),
+            message_id=uuid.uuid4().hex,
             from_agent=self.name,
             to_agent=to_agent,
             content={},
@@ -9,7 +9,7 @@ Usage tracking service for monitoring LLM API calls and token consumption.
 import os
 from datetime import datetime
 from typing import Dict, List, Optional, Any
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from dotenv import load_dotenv
@@ -91,12 +91,13 @@ class UsageTracker:
         """
         session = self.get_session()
         try:
-            records = session.query(UsageRecord).all()
-            
-            total_calls = len(records)
-            total_input_tokens = sum(r.input_tokens for r in records)
-            total_output_tokens = sum(r.output_tokens for r in records)
-            total_tokens = sum(r.total_tokens for r in records)
+            # Aggregate in SQL instead of loading every record into Python
+            total_calls, total_input_tokens, total_output_tokens, total_tokens = session.query(
+                func.count(UsageRecord.id),
+                func.coalesce(func.sum(UsageRecord.input_tokens), 0),
+                func.coalesce(func.sum(UsageRecord.output_tokens), 0),
+                func.coalesce(func.sum(UsageRecord.total_tokens), 0)
+            ).one()
             
             return {
                 "total_api_calls": total_calls,
@@ -120,14 +121,14 @@ class UsageTracker:
         """
         session = self.get_session()
         try:
-            records = session.query(UsageRecord).filter(
+            total_calls, total_input_tokens, total_output_tokens, total_tokens = session.query(
+                func.count(UsageRecord.id),
+                func.coalesce(func.sum(UsageRecord.input_tokens), 0),
+                func.coalesce(func.sum(UsageRecord.output_tokens), 0),
+                func.coalesce(func.sum(UsageRecord.total_tokens), 0)
+            ).filter(
                 UsageRecord.agent_name == agent_name
-            ).all()
-            
-            total_calls = len(records)
-            total_input_tokens = sum(r.input_tokens for r in records)
-            total_output_tokens = sum(r.output_tokens for r in records)
-            total_tokens = sum(r.total_tokens for r in records)
+            ).one()
             
             return {
                 "agent_name": agent_name,
@@ -148,27 +149,25 @@ class UsageTracker:
         """
         session = self.get_session()
         try:
-            records = session.query(UsageRecord).all()
-            
-            # Group by agent name
-            agent_stats = {}
-            for record in records:
-                if record.agent_name not in agent_stats:
-                    agent_stats[record.agent_name] = {
-                        "agent_name": record.agent_name,
-                        "total_api_calls": 0,
-                        "total_input_tokens": 0,
-                        "total_output_tokens": 0,
-                        "total_tokens": 0
-                    }
-                
-                stats = agent_stats[record.agent_name]
-                stats["total_api_calls"] += 1
-                stats["total_input_tokens"] += record.input_tokens
-                stats["total_output_tokens"] += record.output_tokens
-                stats["total_tokens"] += record.total_tokens
+            # Group by agent name in SQL so only one row per agent is returned
+            rows = session.query(
+                UsageRecord.agent_name,
+                func.count(UsageRecord.id),
+                func.coalesce(func.sum(UsageRecord.input_tokens), 0),
+                func.coalesce(func.sum(UsageRecord.output_tokens), 0),
+                func.coalesce(func.sum(UsageRecord.total_tokens), 0)
+            ).group_by(UsageRecord.agent_name).all()
             
-            return list(agent_stats.values())
+            return [
+                {
+                    "agent_name": agent_name,
+                    "total_api_calls": total_calls,
+                    "total_input_tokens": total_input_tokens,
+                    "total_output_tokens": total_output_tokens,
+                    "total_tokens": total_tokens
+                }
+                for agent_name, total_calls, total_input_tokens, total_output_tokens, total_tokens in rows
+            ]
         finally:
             session.close()
 
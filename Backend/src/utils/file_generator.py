@@ -15,6 +15,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Frontend file path filters used when extracting files from generated code
+FRONTEND_FILE_EXTENSIONS = ('.jsx', '.js', '.json', '.html', '.css', '.tsx', '.ts')
+ROOT_CONFIG_FILES = frozenset({'package.json', 'tsconfig.json'})
+COMMON_WORDS = frozenset({'on', 'off', 'in', 'at', 'to', 'as', 'if', 'of', 'is', 'it', 'we', 'do', 'go', 'no'})
+
 
 class FileGenerator:
     """Service for generating and saving project files."""
@@ -351,24 +356,22 @@ pytest tests/
                 filepath = filepath.lstrip('/').replace('frontend/', '').strip()
                 
                 # Validate filepath - must have valid extension or be a known config file
-                valid_extensions = ['.jsx', '.js', '.json', '.html', '.css', '.tsx', '.ts']
-                has_valid_extension = any(filepath.endswith(ext) for ext in valid_extensions)
-                is_known_config = filepath in ['package.json', 'tsconfig.json']
+                has_valid_extension = filepath.endswith(FRONTEND_FILE_EXTENSIONS)
+                is_known_config = filepath in ROOT_CONFIG_FILES
                 
                 # Skip if filepath is invalid
                 # Must have valid extension OR be a known config file
                 # Must not be a common word
                 # Must be at least 5 chars (to avoid "on", "off", etc.)
-                common_words = ['on', 'off', 'in', 'at', 'to', 'as', 'if', 'of', 'is', 'it', 'we', 'do', 'go', 'no']
                 if not (has_valid_extension or is_known_config):
                     continue
-                if len(filepath) < 5 and filepath not in ['package.json', 'tsconfig.json']:
+                if len(filepath) < 5 and not is_known_config:
                     continue
-                if filepath.lower() in common_words:
+                if filepath.lower() in COMMON_WORDS:
                     continue
                 
                 # Handle root level files (package.json, tsconfig.json)
-                if filepath in ['package.json', 'tsconfig.json']:
+                if is_known_config:
                     # Keep at root level
                     pass
                 # Don't modify paths that already start with public/ or src/